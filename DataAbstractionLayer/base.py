@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 
 from schemas.api_models import OrderStatusResponse
 from schemas.db_models import MermaModel, MermaReasonModel, PedidoModel, OrderModelforOrder, SchedulableOrderModel, MachineModel, SchedulableAllMachineModel, SchedulableOrdersFromMachine
@@ -16,8 +16,8 @@ class BaseDatabase(ABC):
         pass
     
     @abstractmethod
-    async def update_machine_status(self, machine_id: str, status: Optional[str] = None, functional_inks: Optional[int] = None) -> bool:
-        """Actualiza el estado y/o las unidades de una máquina"""
+    async def update_machine_status(self, machine_id: str, status: Optional[str] = None, functional_inks: Optional[int] = None, inks_delta: Optional[int] = None) -> Optional[MachineModel]:
+        """Actualiza el estado y/o las unidades de una máquina y devuelve la fila actualizada (None si no existe)."""
         pass
     
     @abstractmethod
@@ -75,11 +75,39 @@ class BaseDatabase(ABC):
         """
         pass
 
+    @abstractmethod
+    def stream_machines_status_with_details(self, machine_id: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Versión en streaming de get_machines_status_with_details: genera las filas de forma
+        asíncrona a medida que llegan de la base de datos.
+        """
+        pass
+
     @abstractmethod
     async def get_machine_by_name_or_pseudonim(self, name: str) -> Optional[MachineModel]:
         """Obtiene información de una máquina por nombre o seudónimo."""
         pass
 
+    @abstractmethod
+    async def resolve_machine(self, identifier: str) -> Optional[MachineModel]:
+        """Busca una máquina por ID o, si no existe, por nombre o seudónimo, en una sola consulta."""
+        pass
+
+    @abstractmethod
+    async def get_machine_and_orders(self, identifier: str) -> Tuple[Optional[MachineModel], List[SchedulableOrderModel]]:
+        """Resuelve la máquina y, si está activa, devuelve también sus pedidos planificables."""
+        pass
+
+    @abstractmethod
+    async def classify_and_update(self, identifiers: List[str], to_status: str, from_status: Optional[str] = None) -> Dict[str, List]:
+        """
+        Resuelve los identificadores (ID, nombre o seudónimo) y cambia a `to_status` las máquinas elegibles
+        (en `from_status`, o en cualquier estado distinto de `to_status` si no se indica), todo en una transacción.
+        Devuelve los identificadores originales clasificados en 'updated', 'already' y 'not_found',
+        más los IDs modificados en 'updated_ids'.
+        """
+        pass
+
     @abstractmethod
     async def get_queue_item_by_pedido_id(self, pedido_id: int) -> Optional[OrderModelforOrder]:
         """Busca un item de la cola por su pedido_id."""
@@ -108,6 +136,11 @@ class BaseDatabase(ABC):
         """Borra la planificación actual de una máquina y la reemplaza con la nueva secuencia."""
         pass
 
+    @abstractmethod
+    async def overwrite_all_schedules(self, schedules_by_machine: Dict[int, List[Dict[str, Any]]]) -> bool:
+        """Reemplaza en una sola transacción la planificación de todas las máquinas indicadas."""
+        pass
+
     @abstractmethod
     async def get_schedulable_orders_for_all_machines(self) -> List[SchedulableAllMachineModel]:
         """Ejecuta la consulta para obtener todos los pedidos planificables de todas las máquinas."""
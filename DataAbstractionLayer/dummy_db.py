@@ -1,50 +1,69 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 from datetime import datetime
 import uuid
 
 from .base import BaseDatabase
-from schemas.db_models import MachineModel, OrderModel, ProductionQueueItem
+from schemas.api_models import OrderStatusResponse
+from schemas.db_models import (
+    MachineModel, OrderModel, ProductionQueueItem, MermaModel, MermaReasonModel, PedidoModel,
+    OrderModelforOrder, SchedulableOrderModel, SchedulableAllMachineModel, SchedulableOrdersFromMachine
+)
 
 class DummyDB(BaseDatabase):
     """
     Implementación dummy para el MVP. Simula una base de datos en memoria
     Utilizando moedelos Pydantic para garantizar la consistencia de los datos y los tipos.
+    No tiene pedidos planificables: las consultas de planificación devuelven listas vacías.
     """
-    
+
+    # Campos de las máquinas semilla que no cambian entre ellas
+    _MAQUINA_BASE = dict(ancho_maximo=1000, planta=1, comparte_rodillos=None, tiempo_cambio_unidad=15.0, velocidad_promedio=100.0)
+
     def __init__(self):
         # Almacenamos instancias de modelos Pydantic, no con diccionarios o datos brutos.
-        self._machines: Dict[str, MachineModel] = {
+        self._machines: Dict[int, MachineModel] = {
             m.id: m for m in [
-                MachineModel(id="Titán", name="Máquina Titán", status="active", total_units=6, active_units=6, current_order_id=None),
-                MachineModel(id="Heidelberg", name="Máquina Heidelberg", status="active", total_units=8, active_units=8, current_order_id="123456"),
-                MachineModel(id="A", name="Máquina A", status="active", total_units=4, active_units=4, current_order_id="789012"),
-                MachineModel(id="B", name="Máquina B", status="maintenance", total_units=4, active_units=4, current_order_id=None),
+                MachineModel(id=1, nombre="Titán", numero_tintas=6, tintas_funcionando=6, estatus="activa", seudonimo="T1", **self._MAQUINA_BASE),
+                MachineModel(id=2, nombre="Heidelberg", numero_tintas=8, tintas_funcionando=8, estatus="activa", seudonimo=None, **self._MAQUINA_BASE),
+                MachineModel(id=3, nombre="Máquina A", numero_tintas=4, tintas_funcionando=4, estatus="activa", seudonimo="A", **self._MAQUINA_BASE),
+                MachineModel(id=4, nombre="Máquina B", numero_tintas=4, tintas_funcionando=4, estatus="mantenimiento", seudonimo="B", **self._MAQUINA_BASE),
             ]
         }
-        
-        self._orders: Dict[str, OrderModel] = {
+
+        self._orders: Dict[int, OrderModel] = {
             o.id: o for o in [
-                OrderModel(id="123456", name="Etiquetas Premium", total_kg=500, num_colors=4, printed_kg=350, assigned_machine_id="Heidelberg", status="in_progress", priority=2),
-                OrderModel(id="789012", name="Empaque Especial", total_kg=200, num_colors=2, printed_kg=180, assigned_machine_id="A", status="in_progress", priority=1),
-                OrderModel(id="555777", name="Bolsas Comerciales", total_kg=300, num_colors=3, printed_kg=0, assigned_machine_id=None, status="pending", priority=0),
+                OrderModel(id=123456, name="Etiquetas Premium", total_kg=500, num_colors=4, printed_kg=350, assigned_machine_id="2", status="in_progress", priority=2),
+                OrderModel(id=789012, name="Empaque Especial", total_kg=200, num_colors=2, printed_kg=180, assigned_machine_id="3", status="in_progress", priority=1),
+                OrderModel(id=555777, name="Bolsas Comerciales", total_kg=300, num_colors=3, printed_kg=0, assigned_machine_id=None, status="pending", priority=0),
             ]
         }
-        
+
         self._production_queue: List[ProductionQueueItem] = [
-            ProductionQueueItem(order_id=self._orders["123456"], machine_id=self._machines["Heidelberg"], sequence_order=1),
-            ProductionQueueItem(order_id=self._orders["789012"], machine_id=self._machines["A"], sequence_order=2),
-            ProductionQueueItem(order_id=self._orders["555777"], machine_id=None, sequence_order=3)
+            ProductionQueueItem(order_id=self._orders[123456], machine_id=self._machines[2], sequence_order=1),
+            ProductionQueueItem(order_id=self._orders[789012], machine_id=self._machines[3], sequence_order=2),
+            ProductionQueueItem(order_id=self._orders[555777], machine_id=None, sequence_order=3)
         ]
-        
+
+        # Filas de orden_impresion_i_a_s (planificación), con los nombres de atributo del ORM
+        self._schedule: List[Dict[str, Any]] = []
+        self._waste_reasons: Dict[str, MermaReasonModel] = {
+            r.name: r for r in [
+                MermaReasonModel(id=1, name="Arranque", description="Material usado al ajustar la máquina"),
+                MermaReasonModel(id=2, name="Registro", description="Impresión fuera de registro"),
+            ]
+        }
+
         self._roll_weights = []
-        self._waste_records = []
+        self._waste_records: List[MermaModel] = []
 
     # Las firmas de los métodos y los tipos de retorno coinciden con BaseDatabase.
     async def get_machine_by_id(self, machine_id: str) -> Optional[MachineModel]:
-        return self._machines.get(machine_id)
-    
-    async def get_order_by_id(self, order_id: str) -> Optional[OrderModel]:
-        return self._orders.get(order_id)
+        machine = self._machines.get(int(machine_id)) if str(machine_id).isdigit() else None
+        return machine.model_copy() if machine else None
+
+    async def get_order_by_id(self, order_id: int) -> Optional[PedidoModel]:
+        # Los pedidos de la tabla 'pedido' no se simulan
+        return None
 
     async def check_connection(self) -> bool:
         """
@@ -52,70 +71,180 @@ class DummyDB(BaseDatabase):
         como siempre está "Conectada", simplmemente devuelve True
         """
         return True
-    
-    async def update_machine_status(self, machine_id: str, status: str, disable_units: Optional[int] = None) -> bool:
-        if machine := self._machines.get(machine_id):
-            machine.status = status
-            if disable_units is not None:
-                machine.active_units = machine.total_units - disable_units
-            return True
-        return False
-    
+
+    async def update_machine_status(self, machine_id: str, status: Optional[str] = None, functional_inks: Optional[int] = None, inks_delta: Optional[int] = None) -> Optional[MachineModel]:
+        machine = self._machines.get(int(machine_id)) if str(machine_id).isdigit() else None
+        if machine is None:
+            return None
+        if status is not None:
+            machine.estatus = status
+        if inks_delta is not None:
+            # Mismo ajuste al rango [0, numero_tintas] que hace la DB real
+            machine.functional_inks = min(machine.inks, max(0, machine.functional_inks + inks_delta))
+        elif functional_inks is not None:
+            machine.functional_inks = functional_inks
+        # Como la DB real, se devuelve la fila actualizada (una copia, no el objeto almacenado)
+        return machine.model_copy()
+
     async def get_production_queue(self, machine_id: Optional[str] = None) -> List[ProductionQueueItem]:
         queue_copy = self._production_queue.copy()
         if machine_id:
-            return [item for item in queue_copy if item.machine and item.machine.id == machine_id]
+            return [item for item in queue_copy if item.machine_id and str(item.machine_id.id) == str(machine_id)]
         return queue_copy
-    
+
     async def prioritize_order(self, order_id: str, machine_id: Optional[str] = None, reorder_rest: bool = True) -> bool:
         target_item_index = -1
         for i, item in enumerate(self._production_queue):
-            if item.order_id.id == order_id:
+            if str(item.order_id.id) == str(order_id):
                 target_item_index = i
                 break
-        
+
         if target_item_index == -1:
             return False
-        
+
         # Mover el item al principio de la cola
         order_item = self._production_queue.pop(target_item_index)
 
-        if machine_id and machine_id in self._machines:
-            order_item.machine = self._machines[machine_id]
+        machine = await self.get_machine_by_id(machine_id) if machine_id else None
+        if machine:
+            order_item.machine_id = machine
 
         self._production_queue.insert(0, order_item)
-        
+
         # Re-indexar las posiciones si es necesario
         if reorder_rest:
             for i, item in enumerate(self._production_queue):
                 item.sequence_order = i + 1
         else:
             order_item.sequence_order = 0 # 0 para la máxima prioridad sin afectar al resto
-        
+
         return True
-    
+
     async def register_roll_weight(self, machine_id: str, order_id: str, weight_kg: float) -> bool:
         record = {
-            "id": str(uuid.uuid4()), "machine_id": machine_id, 
+            "id": str(uuid.uuid4()), "machine_id": machine_id,
             "order_id": order_id, "weight_kg": weight_kg, "timestamp": datetime.now()
         }
         self._roll_weights.append(record)
         return True
-    
-    async def register_waste(self, order_id: str, machine_id: str, weight_kg: float, reason: str) -> bool:
-        record = {
-            "id": str(uuid.uuid4()), "order_id": order_id, "machine_id": machine_id, 
-            "weight_kg": weight_kg, "reason": reason, "timestamp": datetime.now()
-        }
+
+    async def register_waste_record(self, order_id: int, process: str, reason_id: int, quantity: float, observations: str, user_id: int) -> MermaModel:
+        record = MermaModel(
+            id=len(self._waste_records) + 1, order_id=order_id, process=process, reason_id=reason_id,
+            quantity=quantity, observations=observations, user_id=user_id
+        )
         self._waste_records.append(record)
-        return True
-    
+        return record
+
+    async def get_waste_reason_by_name(self, name: str) -> Optional[MermaReasonModel]:
+        return self._waste_reasons.get(name)
+
     async def get_all_machine_status(self) -> List[MachineModel]:
-        return list(self._machines.values())
-    
-    async def get_machine_by_name_or_pseudonym(self, name: str) -> Optional[MachineModel]:
+        return [machine.model_copy() for machine in self._machines.values()]
+
+    async def get_machine_by_name_or_pseudonim(self, name: str) -> Optional[MachineModel]:
         """Implementación en memoria para buscar por nombre o seudónimo."""
         for machine in self._machines.values():
             if machine.name == name or machine.pseudonym == name:
-                return machine
-        return None
\ No newline at end of file
+                return machine.model_copy()
+        return None
+
+    def _match_rank(self, machine: MachineModel, identifier: str) -> Optional[int]:
+        """Como MySQLDB._match_rank: 0 = ID, 1 = nombre, 2 = seudónimo, None = no coincide."""
+        if identifier.isdigit() and machine.id == int(identifier):
+            return 0
+        if machine.name == identifier:
+            return 1
+        if machine.pseudonym == identifier:
+            return 2
+        return None
+
+    def _best_match(self, identifier: str) -> Optional[MachineModel]:
+        """La máquina con la mejor coincidencia para el identificador (a igual rango, el menor ID)."""
+        candidatas = [(rango, machine.id, machine) for machine in self._machines.values()
+                      if (rango := self._match_rank(machine, identifier)) is not None]
+        return min(candidatas, key=lambda c: c[:2])[2] if candidatas else None
+
+    async def resolve_machine(self, identifier: str) -> Optional[MachineModel]:
+        machine = self._best_match(str(identifier))
+        return machine.model_copy() if machine else None
+
+    async def get_machine_and_orders(self, identifier: str) -> Tuple[Optional[MachineModel], List[SchedulableOrderModel]]:
+        return await self.resolve_machine(identifier), []
+
+    async def classify_and_update(self, identifiers: List[str], to_status: str, from_status: Optional[str] = None) -> Dict[str, List]:
+        resultado = {"updated": [], "already": [], "not_found": [], "updated_ids": []}
+        for identifier in identifiers:
+            machine = self._best_match(str(identifier))
+            if machine is None:
+                resultado["not_found"].append(identifier)
+                continue
+            elegible = machine.estatus == from_status if from_status is not None else machine.estatus != to_status
+            # Un mismo identificador (o alias de la misma máquina) repetido cuenta como ya procesado
+            if not elegible or machine.id in resultado["updated_ids"]:
+                resultado["already"].append(identifier)
+                continue
+            resultado["updated_ids"].append(machine.id)
+            resultado["updated"].append(identifier)
+        for machine_id in resultado["updated_ids"]:
+            self._machines[machine_id].estatus = to_status
+        return resultado
+
+    async def get_machines_status_with_details(self, machine_id: Optional[int] = None) -> List[Dict]:
+        return [row async for row in self.stream_machines_status_with_details(machine_id)]
+
+    async def stream_machines_status_with_details(self, machine_id: Optional[int] = None) -> AsyncIterator[Dict]:
+        # Mismas llaves que la consulta real; sin pedidos simulados, ninguna máquina tiene orden actual
+        for machine in self._machines.values():
+            if machine_id is None or machine.id == machine_id:
+                yield {
+                    **machine.model_dump(by_alias=True),
+                    "pedido_id": None, "estatus_pedido": None, "producto_nombre": None,
+                    "posicion_en_cola": None, "probable_fecha_entrega": None,
+                    "kilos_requeridos": 0, "kilos_impresos": 0, "porcentaje_progreso": 0,
+                }
+
+    async def get_full_order_status_details(self, pedido_id: int) -> Optional[OrderStatusResponse]:
+        return None
+
+    async def get_order_position_in_queue(self, pedido_id: int) -> Optional[OrderModelforOrder]:
+        return await self.get_queue_item_by_pedido_id(pedido_id)
+
+    async def get_queue_item_by_pedido_id(self, pedido_id: int) -> Optional[OrderModelforOrder]:
+        fila = next((fila for fila in self._schedule if fila["order_id"] == pedido_id), None)
+        return OrderModelforOrder.model_validate(fila) if fila else None
+
+    async def get_production_queue_for_machine(self, maquina_id: int) -> List[OrderModelforOrder]:
+        filas = sorted((fila for fila in self._schedule if fila["machine_id"] == maquina_id), key=lambda f: f["order_production"])
+        return [OrderModelforOrder.model_validate(fila) for fila in filas]
+
+    async def update_production_queue(self, updates: List[Dict[str, Any]]) -> bool:
+        return await self.update_queue_dates_and_times(updates)
+
+    async def get_schedulable_orders_for_machine(self, maquina_id: int) -> List[SchedulableOrderModel]:
+        return []
+
+    async def get_schedulable_orders_for_all_machines(self) -> List[SchedulableAllMachineModel]:
+        return []
+
+    async def get_schedulable_orders_by_ids(self, order_ids: List[int]) -> List[SchedulableOrdersFromMachine]:
+        return []
+
+    async def overwrite_machine_schedule(self, maquina_id: int, new_schedule: List[Dict[str, Any]]) -> bool:
+        return await self.overwrite_all_schedules({maquina_id: new_schedule})
+
+    async def overwrite_all_schedules(self, schedules_by_machine: Dict[int, List[Dict[str, Any]]]) -> bool:
+        self._schedule = [fila for fila in self._schedule if fila["machine_id"] not in schedules_by_machine]
+        siguiente_id = max((fila["id"] for fila in self._schedule), default=0) + 1
+        for schedule in schedules_by_machine.values():
+            for fila in schedule:
+                self._schedule.append({"id": siguiente_id, **fila})
+                siguiente_id += 1
+        return True
+
+    async def update_queue_dates_and_times(self, updates: List[Dict[str, Any]]) -> bool:
+        por_id = {fila["id"]: fila for fila in self._schedule}
+        for update in updates:
+            if update["id"] in por_id:
+                por_id[update["id"]].update(update)
+        return True
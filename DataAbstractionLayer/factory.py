@@ -0,0 +1,35 @@
+import logging
+
+from core.config import settings
+from DataAbstractionLayer.base import BaseDatabase
+
+logger = logging.getLogger(__name__)
+
+def create_db_instance() -> BaseDatabase:
+    """
+    Fábrica de instancias de la DAL (sin caché).
+    Lee la configuración y devuelve una instancia nueva de la implementación de base de datos correcta.
+    La API la reutiliza a través de get_db_instance; los workers de Celery crean (y liberan) la suya.
+    """
+    if settings.DATABASE_TYPE == "mysql":
+        from DataAbstractionLayer.mysql_db import MySQLDB
+        logger.info("Usando implementación de base de datos: MySQL.")
+        # Se asegura de que la URL esté configurada (ya validado en config.py)
+        return MySQLDB(
+            settings.DATABASE_URL,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+
+    if settings.DATABASE_TYPE == "postgres":
+        from DataAbstractionLayer.postgres_db import PostgresDB
+        logger.info("Usando implementación de base de datos: PostgreSQL.")
+        # Se asegura de que la URL esté configurada (ya validado en config.py)
+        return PostgresDB(settings.DATABASE_URL)
+
+    # Por defecto, o si se especifica 'dummy', usa la base de datos en memoria.
+    from DataAbstractionLayer.dummy_db import DummyDB
+    logger.info("Usando implementación de base de datos: DummyDB (en memoria).")
+    return DummyDB()
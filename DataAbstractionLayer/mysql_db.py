@@ -1,9 +1,9 @@
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 
-from sqlalchemy import select, update, or_, text, delete, func
+from sqlalchemy import select, update, or_, text, delete, func, case
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, raiseload
 
 from DataAbstractionLayer.base import BaseDatabase
 
@@ -12,7 +12,7 @@ from schemas.api_models import OrderStatusResponse
 from schemas.orm_models import (
     Machine as MachineORM, RazonMermas as RazonMermasORM, Mermas as MermasORM,
     Pedidos as PedidoORM, OrdenPedido as OrdenPedidoORM, Etiqueta as EtiquetaORM,
-    Productos as ProductosORM, SubEtiqueta1 as SubEtiqueta1ORM
+    Productos as ProductosORM, SubEtiqueta1 as SubEtiqueta1ORM, verificar_tipos_cacheables
 )# Importamos los modelos ORM
 
 from schemas.db_models import (
@@ -22,12 +22,157 @@ from schemas.db_models import (
 
 logger = logging.getLogger(__name__)
 
+# Consultas SQL crudas de la DAL. Se construyen una sola vez al importar el módulo: text() analiza
+# los parámetros (:nombre) al crearse y la caché de sentencias compiladas reutiliza el mismo objeto.
+MACHINES_STATUS_WITH_DETAILS_SQL = text("""
+    WITH
+    -- Paso 1: Encontrar la primera orden en la cola para cada máquina
+    FirstOrderInQueue AS (
+        SELECT
+            maquina_id,
+            pedido_id,
+            orden,
+            probable_fecha_entrega
+        FROM orden_impresion_i_a_s
+        WHERE orden = 1
+    ),
+    -- Paso 2: Calcular los kilos impresos por pedido
+    KilosImpresos AS (
+        SELECT pedido_id, SUM(peso_neto_impresion) as kilos_impresos
+        FROM sub_etiqueta_1 WHERE mostrar = 1 GROUP BY pedido_id
+    ),
+    -- Paso 3: Calcular los kilos totales requeridos por pedido
+    KilosRequeridos AS (
+        SELECT pedido_id, SUM(peso_neto) as kilos_requeridos
+        FROM etiqueta WHERE etiqueta_para = 1 AND mostrar = 1 GROUP BY pedido_id
+    )
+    -- Consulta Final: Unir toda la información
+    SELECT
+        m.*,
+        -- Campos de las otras tablas con alias para evitar colisiones
+        p.id as pedido_id, p.status as estatus_pedido, prod.nombre as producto_nombre,
+        fo.orden as posicion_en_cola, fo.probable_fecha_entrega,
+        COALESCE(kr.kilos_requeridos, 0) as kilos_requeridos,
+        COALESCE(ki.kilos_impresos, 0) as kilos_impresos,
+        -- Progreso calculado en la consulta; 0 si no hay kilos requeridos
+        COALESCE(ROUND(100 * COALESCE(ki.kilos_impresos, 0) / NULLIF(kr.kilos_requeridos, 0), 1), 0) as porcentaje_progreso
+    FROM maquina m
+    LEFT JOIN FirstOrderInQueue fo ON m.id = fo.maquina_id
+    LEFT JOIN pedido p ON fo.pedido_id = p.id
+    LEFT JOIN productos prod ON p.producto_id = prod.id_producto
+    LEFT JOIN KilosRequeridos kr ON fo.pedido_id = kr.pedido_id
+    LEFT JOIN KilosImpresos ki ON fo.pedido_id = ki.pedido_id
+    WHERE
+        m.estatus = 'activa'
+        -- Filtro opcional para buscar una sola máquina
+        AND (:machine_id IS NULL OR m.id = :machine_id);
+""")
+
+SCHEDULABLE_ORDERS_FOR_MACHINE_SQL = text("""
+        SELECT
+            p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
+            p.prioridad_planeacion,
+            DATEDIFF(COALESCE(p.fecha_forzosa_entrega, p.fecha_entrega), CURDATE()) as dias_restantes,
+            prod.nombre as producto_nombre,
+            JSON_EXTRACT(p.datos, '$.cantidad') as cantidad,
+            JSON_EXTRACT(p.datos, '$.pantone') as colores,
+            JSON_LENGTH(JSON_EXTRACT(p.datos, '$.pantone')) as num_colores,
+            JSON_EXTRACT(p.datos, '$.materiales') as materiales,
+            SUM(e.peso_neto) as total_peso_neto,
+            SUM(e.metros_impresion) as total_metros_impresion,
+            COUNT(DISTINCT e.numero) as num_etiquetas
+    FROM pedido p
+    INNER JOIN productos prod ON p.producto_id = prod.id_producto
+    INNER JOIN tipos_de_productos tdp ON prod.id_tipo_producto = tdp.id_tipo_producto
+    INNER JOIN etiqueta e ON e.pedido_id = p.id AND e.etiqueta_para = 1 AND e.mostrar = 1 AND e.peso_neto > 0
+    WHERE p.status <= 5
+    AND JSON_VALID(p.datos)
+    AND JSON_UNQUOTE(JSON_EXTRACT(p.datos, '$.maquina')) = :maquina_id
+    AND tdp.tipo_proceso NOT IN (6, 7, 9)
+    GROUP BY
+        p.id, prod.nombre
+    ORDER BY
+        CASE WHEN dias_restantes < 3 THEN 1 ELSE 2 END,
+        dias_restantes ASC, p.prioridad_planeacion ASC;
+""")
+
+SCHEDULABLE_ORDERS_FOR_ALL_MACHINES_SQL = text("""
+    SELECT 
+        p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
+        p.prioridad_planeacion,
+        DATEDIFF(COALESCE(p.fecha_forzosa_entrega, p.fecha_entrega), CURDATE()) as dias_restantes,
+        prod.nombre as producto_nombre,
+        JSON_EXTRACT(p.datos, '$.cantidad') as cantidad,
+        JSON_EXTRACT(p.datos, '$.pantone') as colores,
+        JSON_LENGTH(JSON_EXTRACT(p.datos, '$.pantone')) as num_colores,
+        JSON_EXTRACT(p.datos, '$.materiales') as materiales,
+        SUM(e.peso_neto) as total_peso_neto,
+        SUM(e.metros_impresion) as total_metros_impresion,
+        COUNT(DISTINCT e.numero) as num_etiquetas,
+        -- Se usa JSON_UNQUOTE para obtener el valor limpio
+        JSON_UNQUOTE(JSON_EXTRACT(p.datos, '$.maquina')) as maquina_id
+    FROM pedido p
+    INNER JOIN productos prod ON p.producto_id = prod.id_producto
+    INNER JOIN tipos_de_productos tdp ON prod.id_tipo_producto = tdp.id_tipo_producto
+    INNER JOIN etiqueta e ON e.pedido_id = p.id AND e.etiqueta_para = 1 AND e.mostrar = 1 AND e.peso_neto > 0
+    WHERE p.status <= 5
+        AND JSON_VALID(p.datos)
+        -- NOTA: Esta lista de máquinas está hardcodeada. En el futuro, podría ser dinámica.
+        AND JSON_UNQUOTE(JSON_EXTRACT(p.datos, '$.maquina')) IN ('1','2','4','9','13','14','15','16','17')
+        AND tdp.tipo_proceso NOT IN (6, 7, 9)
+    -- El GROUP BY debe incluir todas las columnas no agregadas del SELECT.
+    GROUP BY 
+        p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
+        p.prioridad_planeacion, prod.nombre
+    ORDER BY 
+        maquina_id, dias_restantes ASC;
+""")
+
+SCHEDULABLE_ORDERS_BY_MACHINE_QUEUE_SQL = text("""
+    SELECT
+        p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
+        p.prioridad_planeacion,
+        DATEDIFF(COALESCE(p.fecha_forzosa_entrega, p.fecha_entrega), CURDATE()) as dias_restantes,
+        prod.nombre as producto_nombre,
+        oias.id as id_en_cola, -- ID de la fila en la tabla de planificación (CRUCIAL)
+        oias.orden as order_production,
+        oias.probable_fecha_entrega,
+        oias.razon,
+        JSON_EXTRACT(p.datos, '$.cantidad') as cantidad,
+        JSON_EXTRACT(p.datos, '$.pantone') as colores,
+        JSON_LENGTH(JSON_EXTRACT(p.datos, '$.pantone')) as num_colores,
+        JSON_EXTRACT(p.datos, '$.materiales') as materiales,
+        SUM(e.peso_neto) as total_peso_neto,
+        SUM(e.metros_impresion) as total_metros_impresion,
+        COUNT(DISTINCT e.numero) as num_etiquetas
+    FROM orden_impresion_i_a_s oias
+    INNER JOIN pedido p ON oias.pedido_id = p.id
+    INNER JOIN productos prod ON p.producto_id = prod.id_producto
+    LEFT JOIN etiqueta e ON oias.pedido_id = e.pedido_id AND e.etiqueta_para = 1 AND e.mostrar = 1 AND e.peso_neto > 0
+    WHERE oias.maquina_id = :maquina_id
+    GROUP BY oias.id, p.id, prod.nombre
+    ORDER BY oias.orden ASC;
+""")
+
 class MySQLDB(BaseDatabase):
     """Implementación de la DAL para una base de datos MySQL."""
     
-    def __init__(self, database_url: str):
-        self.engine = create_async_engine(database_url)
+    def __init__(self, database_url: str, pool_size: int = 10, max_overflow: int = 40, pool_timeout: int = 30, pool_recycle: int = 1800):
+        # Las inserciones en bloque (executemany) se agrupan en INSERT de hasta 1000 filas.
+        # La caché de sentencias compiladas se acota para que no crezca sin límite.
+        # El pool mantiene conexiones abiertas entre requests; pool_recycle las renueva antes
+        # de que MySQL las cierre por inactividad.
+        self.engine = create_async_engine(
+            database_url,
+            insertmanyvalues_page_size=1000,
+            query_cache_size=1200,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+        )
         self.async_session = sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        verificar_tipos_cacheables()
         logger.info("Implementación de DAL para MySQL inicializada.")
 
     async def check_connection(self) -> bool:
@@ -42,7 +187,7 @@ class MySQLDB(BaseDatabase):
 
     async def get_all_machine_status(self) -> List[MachineModel]: # lista para trabajar
         async with self.async_session() as session:
-            stmt = select(MachineORM)
+            stmt = select(MachineORM).options(MachineORM.list_projection())
             result = await session.execute(stmt)
             machines_orm = result.scalars().all()
             
@@ -51,7 +196,7 @@ class MySQLDB(BaseDatabase):
 
     async def get_machine_by_id(self, machine_id: str) -> Optional[MachineModel]: # lista para trabajar
         async with self.async_session() as session:
-            stmt = select(MachineORM).where(MachineORM.id == machine_id)
+            stmt = select(MachineORM).options(MachineORM.list_projection()).where(MachineORM.id == machine_id)
             result = await session.execute(stmt)
             machine_orm = result.scalar_one_or_none()
             
@@ -63,7 +208,7 @@ class MySQLDB(BaseDatabase):
     async def get_machine_by_name_or_pseudonim(self, name: str) -> Optional[MachineModel]: # lista para trabajar
         async with self.async_session() as session:
             # La clausula or_() permite buscar por nombre o seudónimo
-            stmt = select(MachineORM).where(
+            stmt = select(MachineORM).options(MachineORM.list_projection()).where(
                 or_(MachineORM.name == name, MachineORM.pseudonym == name)
             )
             result = await session.execute(stmt)
@@ -74,35 +219,154 @@ class MySQLDB(BaseDatabase):
                 return MachineModel.model_validate(machine_orm)
             return None
     
-    async def update_machine_status(self, machine_id: str, status: Optional[str] = None, functional_inks: Optional[int] = None) -> bool: # lista para trabajar
+    @staticmethod
+    def _match_rank(identifier: str):
+        """Tipo de coincidencia de una fila con el identificador: 0 = ID, 1 = nombre, 2 = seudónimo, NULL = no coincide."""
+        ramas = [(MachineORM.id == int(identifier), 0)] if identifier.isdigit() else []
+        ramas += [(MachineORM.name == identifier, 1), (MachineORM.pseudonym == identifier, 2)]
+        return case(*ramas)
+
+    @staticmethod
+    def _resolve_machine_stmt(identifier: str):
         """
-        Actualiza el estado y/o tintas funcionales de una máquina.
-        Esta función es flexible y solo actualiza los campos que se le proporcionan.
+        Consulta de resolve_machine: busca por ID, nombre o seudónimo y se queda con la mejor coincidencia
+        (el ID antes que el nombre y éste antes que el seudónimo; a igual rango, el menor ID).
         """
-        # --- 1. Validar que al menos un campo se va a actualizar ---
-        if status is None and functional_inks is None:
-            # No hay nada que hacer, pero la operación no falló.
-            return True
+        identifier = str(identifier)
+        condiciones = [MachineORM.name == identifier, MachineORM.pseudonym == identifier]
+        if identifier.isdigit():
+            condiciones.append(MachineORM.id == int(identifier))
+        return (
+            select(MachineORM).options(MachineORM.list_projection())
+            .where(or_(*condiciones))
+            .order_by(MySQLDB._match_rank(identifier), MachineORM.id)
+            .limit(1)
+        )
+
+    async def resolve_machine(self, identifier: str) -> Optional[MachineModel]:
+        """
+        Equivale a get_machine_by_id seguido de get_machine_by_name_or_pseudonim, pero en un solo
+        viaje a la base de datos: si el identificador es numérico y coincide con un ID, esa fila va primero,
+        y una coincidencia exacta de nombre va antes que una de seudónimo.
+        """
+        async with self.async_session() as session:
+            result = await session.execute(self._resolve_machine_stmt(identifier))
+            machine_orm = result.scalar_one_or_none()
+            return MachineModel.model_validate(machine_orm) if machine_orm else None
 
+    async def get_machine_and_orders(self, identifier: str) -> Tuple[Optional[MachineModel], List[SchedulableOrderModel]]:
+        """
+        Resuelve la máquina (ID, nombre o seudónimo) y, solo si está activa, trae sus pedidos planificables,
+        todo con una sola conexión del pool. Devuelve (None, []) si no existe y (máquina, []) si no está activa.
+        """
         async with self.async_session() as session:
-            # --- 2. Construir el diccionario de valores a actualizar ---
+            machine_orm = (await session.execute(self._resolve_machine_stmt(identifier))).scalar_one_or_none()
+            if not machine_orm:
+                return None, []
+
+            machine = MachineModel.model_validate(machine_orm)
+            if machine.estatus != 'activa':
+                return machine, []
+
+            result = await session.execute(SCHEDULABLE_ORDERS_FOR_MACHINE_SQL, {"maquina_id": machine.id})
+            return machine, [SchedulableOrderModel.model_validate(row) for row in result.mappings()]
+
+    @staticmethod
+    def _classify_stmt(identifiers: List[str]):
+        """
+        Consulta de classify_and_update: trae (y bloquea) toda máquina que coincida con algún identificador
+        y, por cada identificador i, una columna r{i} con el tipo de coincidencia de esa fila:
+        0 = ID, 1 = nombre, 2 = seudónimo, NULL = no coincide. Las comparaciones de texto las hace MySQL
+        con la misma collation que el WHERE, así que el emparejamiento coincide con las filas bloqueadas.
+        """
+        nombres = [str(identifier) for identifier in identifiers]
+        ids = [int(identifier) for identifier in nombres if identifier.isdigit()]
+        rangos = [MySQLDB._match_rank(nombre).label(f"r{i}") for i, nombre in enumerate(nombres)]
+        return (
+            select(MachineORM.id, MachineORM.estatus, *rangos)
+            .where(or_(MachineORM.id.in_(ids), MachineORM.name.in_(nombres), MachineORM.pseudonym.in_(nombres)))
+            .with_for_update()
+        )
+
+    @staticmethod
+    def _classify_rows(identifiers: List[str], filas: List[Any], to_status: str, from_status: Optional[str] = None) -> Dict[str, List]:
+        """
+        Clasifica cada identificador con las filas de _classify_stmt: se queda con la fila de menor
+        rango (el ID tiene prioridad sobre el nombre y éste sobre el seudónimo; a igual rango, el menor ID).
+        """
+        resultado = {"updated": [], "already": [], "not_found": [], "updated_ids": []}
+        for i, identifier in enumerate(identifiers):
+            rango = f"r{i}"
+            candidatas = [fila for fila in filas if getattr(fila, rango) is not None]
+            if not candidatas:
+                resultado["not_found"].append(identifier)
+                continue
+            fila = min(candidatas, key=lambda f: (getattr(f, rango), f.id))
+            elegible = fila.estatus == from_status if from_status is not None else fila.estatus != to_status
+            # Un mismo identificador (o alias de la misma máquina) repetido cuenta como ya procesado
+            if not elegible or fila.id in resultado["updated_ids"]:
+                resultado["already"].append(identifier)
+                continue
+            resultado["updated_ids"].append(fila.id)
+            resultado["updated"].append(identifier)
+        return resultado
+
+    async def classify_and_update(self, identifiers: List[str], to_status: str, from_status: Optional[str] = None) -> Dict[str, List]:
+        """
+        Versión orientada a conjuntos de "buscar cada máquina y actualizarla": una consulta resuelve
+        todos los identificadores y bloquea las filas (FOR UPDATE), la clasificación se hace en memoria
+        y un único UPDATE cambia las elegibles. MySQL no tiene RETURNING, así que son dos sentencias
+        dentro de la misma transacción; ninguna otra petición puede cambiar el estado entre ambas.
+        """
+        if not identifiers:
+            return {"updated": [], "already": [], "not_found": [], "updated_ids": []}
+
+        async with self.async_session() as session, session.begin():
+            result = await session.execute(self._classify_stmt(identifiers))
+            resultado = self._classify_rows(identifiers, result.all(), to_status, from_status)
+
+            if resultado["updated_ids"]:
+                await session.execute(
+                    update(MachineORM).where(MachineORM.id.in_(resultado["updated_ids"])).values(estatus=to_status)
+                )
+        return resultado
+
+    async def update_machine_status(self, machine_id: str, status: Optional[str] = None, functional_inks: Optional[int] = None, inks_delta: Optional[int] = None) -> Optional[MachineModel]: # lista para trabajar
+        """
+        Actualiza el estado y/o tintas funcionales de una máquina y devuelve la fila ya actualizada.
+        Esta función es flexible y solo actualiza los campos que se le proporcionan.
+        - 'inks_delta' suma (o resta) unidades a las tintas funcionales; el ajuste al rango
+          [0, numero_tintas] se hace en SQL para que sea atómico y no dependa del valor que calculó el cliente.
+        Devuelve None si la máquina no existe.
+        """
+        async with self.async_session() as session, session.begin():
+            # --- 1. Construir el diccionario de valores a actualizar ---
             values_to_update = {}
             if status is not None:
                 values_to_update["estatus"] = status
-            if functional_inks is not None:
+            if inks_delta is not None:
+                values_to_update["functional_inks"] = func.least(
+                    MachineORM.inks, func.greatest(0, MachineORM.functional_inks + inks_delta)
+                )
+            elif functional_inks is not None:
                 values_to_update["functional_inks"] = functional_inks
 
-            # --- 3. Ejecutar la actualización y hacer commit ---
-            update_stmt = (
-                update(MachineORM)
-                .where(MachineORM.id == machine_id)
-                .values(**values_to_update)
-            )
-            result = await session.execute(update_stmt)
-            await session.commit()
-
-            # rowcount > 0 significa que al menos una fila fue afectada.
-            return result.rowcount > 0
+            # --- 2. Ejecutar la actualización (si hay algo que actualizar) ---
+            # synchronize_session=False evita el SELECT previo que haría "fetch" al no poder evaluar LEAST/GREATEST en Python
+            if values_to_update:
+                await session.execute(
+                    update(MachineORM)
+                    .where(MachineORM.id == machine_id)
+                    .values(**values_to_update)
+                    .execution_options(synchronize_session=False)
+                )
+
+            # --- 3. Leer la fila resultante en la misma transacción ---
+            # MySQL no soporta UPDATE ... RETURNING; la lectura ocurre antes del commit,
+            # así que ve exactamente los valores que dejó el UPDATE.
+            stmt = select(MachineORM).options(MachineORM.list_projection()).where(MachineORM.id == machine_id)
+            machine_orm = (await session.execute(stmt)).scalar_one_or_none()
+            return MachineModel.model_validate(machine_orm) if machine_orm else None
         
     async def register_waste_record(self, order_id: int, process: str, reason_id: int, quantity: float, observations: str, user_id: int) -> MermaModel: # lista para trabajar
         """
@@ -118,8 +382,9 @@ class MySQLDB(BaseDatabase):
                 user_id=user_id # En un sistema real, este ID vendría del usuario autenticado
             )
             session.add(new_record_orm)
+            # El id llega con el INSERT y MermaModel no usa columnas generadas por el servidor,
+            # así que no hace falta un SELECT extra (refresh) después del commit.
             await session.commit()
-            await session.refresh(new_record_orm)
             return MermaModel.model_validate(new_record_orm)
 
     async def get_waste_reason_by_name(self, name: str) -> Optional[MermaReasonModel]: # lista para trabajar
@@ -156,51 +421,17 @@ class MySQLDB(BaseDatabase):
         Ejecuta una consulta compleja que une máquinas, su orden actual (orden=1),
         y calcula el progreso de dicha orden.
         """
-        query = text("""
-            WITH
-            -- Paso 1: Encontrar la primera orden en la cola para cada máquina
-            FirstOrderInQueue AS (
-                SELECT
-                    maquina_id,
-                    pedido_id,
-                    orden,
-                    probable_fecha_entrega
-                FROM orden_impresion_i_a_s
-                WHERE orden = 1
-            ),
-            -- Paso 2: Calcular los kilos impresos por pedido
-            KilosImpresos AS (
-                SELECT pedido_id, SUM(peso_neto_impresion) as kilos_impresos
-                FROM sub_etiqueta_1 WHERE mostrar = 1 GROUP BY pedido_id
-            ),
-            -- Paso 3: Calcular los kilos totales requeridos por pedido
-            KilosRequeridos AS (
-                SELECT pedido_id, SUM(peso_neto) as kilos_requeridos
-                FROM etiqueta WHERE etiqueta_para = 1 AND mostrar = 1 GROUP BY pedido_id
-            )
-            -- Consulta Final: Unir toda la información
-            SELECT
-                m.*,
-                -- Campos de las otras tablas con alias para evitar colisiones
-                p.id as pedido_id, p.status as estatus_pedido, prod.nombre as producto_nombre,
-                fo.orden as posicion_en_cola, fo.probable_fecha_entrega,
-                COALESCE(kr.kilos_requeridos, 0) as kilos_requeridos,
-                COALESCE(ki.kilos_impresos, 0) as kilos_impresos
-            FROM maquina m
-            LEFT JOIN FirstOrderInQueue fo ON m.id = fo.maquina_id
-            LEFT JOIN pedido p ON fo.pedido_id = p.id
-            LEFT JOIN productos prod ON p.producto_id = prod.id_producto
-            LEFT JOIN KilosRequeridos kr ON fo.pedido_id = kr.pedido_id
-            LEFT JOIN KilosImpresos ki ON fo.pedido_id = ki.pedido_id
-            WHERE
-                m.estatus = 'activa'
-                -- Filtro opcional para buscar una sola máquina
-                AND (:machine_id IS NULL OR m.id = :machine_id);
-        """)
+        return [row async for row in self.stream_machines_status_with_details(machine_id)]
 
+    async def stream_machines_status_with_details(self, machine_id: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Igual que get_machines_status_with_details, pero entrega las filas una a una desde un cursor
+        del lado del servidor, sin cargar todo el resultado en memoria de una vez.
+        """
         async with self.engine.connect() as connection:
-            result = await connection.execute(query, {"machine_id": machine_id})
-            return result.mappings().all()
+            result = await connection.stream(MACHINES_STATUS_WITH_DETAILS_SQL, {"machine_id": machine_id})
+            async for row in result.mappings():
+                yield row
         
     async def get_full_order_status_details(self, pedido_id: int) -> Optional[OrderStatusResponse]:
         async with self.async_session() as session:
@@ -261,7 +492,9 @@ class MySQLDB(BaseDatabase):
     async def get_order_position_in_queue(self, pedido_id: int) -> Optional[OrderModelforOrder]:
         """Busca la orden en la tabla de planificación 'orden_impresion_i_a_s'."""
         async with self.async_session() as session:
-            stmt = select(OrdenPedidoORM).where(OrdenPedidoORM.order_id == pedido_id)
+            # raiseload("*"): estas consultas solo leen columnas propias; no cargan machine/pedido
+            # y cualquier acceso accidental a una relación falla en lugar de disparar otro SELECT.
+            stmt = select(OrdenPedidoORM).options(OrdenPedidoORM.schedule_projection(), raiseload("*")).where(OrdenPedidoORM.order_id == pedido_id)
             result = await session.execute(stmt)
             queue_item = result.scalar_one_or_none()
             if queue_item:
@@ -270,14 +503,14 @@ class MySQLDB(BaseDatabase):
         
     async def get_queue_item_by_pedido_id(self, pedido_id: int) -> Optional[OrderModelforOrder]: # por probar
         async with self.async_session() as session:
-            stmt = select(OrdenPedidoORM).where(OrdenPedidoORM.order_id == pedido_id)
+            stmt = select(OrdenPedidoORM).options(OrdenPedidoORM.schedule_projection(), raiseload("*")).where(OrdenPedidoORM.order_id == pedido_id)
             result = await session.execute(stmt)
             item_orm = result.scalar_one_or_none()
             return OrderModelforOrder.model_validate(item_orm) if item_orm else None
 
     async def get_production_queue_for_machine(self, maquina_id: int) -> List[OrderModelforOrder]: # por probar
         async with self.async_session() as session:
-            stmt = select(OrdenPedidoORM).where(OrdenPedidoORM.machine_id == maquina_id).order_by(OrdenPedidoORM.order_production)
+            stmt = select(OrdenPedidoORM).options(OrdenPedidoORM.schedule_projection(), raiseload("*")).where(OrdenPedidoORM.machine_id == maquina_id).order_by(OrdenPedidoORM.order_production)
             result = await session.execute(stmt)
             items_orm = result.scalars().all()
             return [OrderModelforOrder.model_validate(item) for item in items_orm]
@@ -328,74 +561,16 @@ class MySQLDB(BaseDatabase):
 
     async def get_schedulable_orders_for_machine(self, maquina_id: int) -> List[SchedulableOrderModel]:
         """Ejecuta la consulta de planificación de todas las máquinas directamente en la base de datos."""
-        query = text("""
-                    SELECT
-                        p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
-                        p.prioridad_planeacion,
-                        DATEDIFF(COALESCE(p.fecha_forzosa_entrega, p.fecha_entrega), CURDATE()) as dias_restantes,
-                        prod.nombre as producto_nombre,
-                        JSON_EXTRACT(p.datos, '$.cantidad') as cantidad,
-                        JSON_EXTRACT(p.datos, '$.pantone') as colores,
-                        JSON_LENGTH(JSON_EXTRACT(p.datos, '$.pantone')) as num_colores,
-                        JSON_EXTRACT(p.datos, '$.materiales') as materiales,
-                        SUM(e.peso_neto) as total_peso_neto,
-                        SUM(e.metros_impresion) as total_metros_impresion,
-                        COUNT(DISTINCT e.numero) as num_etiquetas
-                FROM pedido p
-                INNER JOIN productos prod ON p.producto_id = prod.id_producto
-                INNER JOIN tipos_de_productos tdp ON prod.id_tipo_producto = tdp.id_tipo_producto
-                INNER JOIN etiqueta e ON e.pedido_id = p.id AND e.etiqueta_para = 1 AND e.mostrar = 1 AND e.peso_neto > 0
-                WHERE p.status <= 5
-                AND JSON_VALID(p.datos)
-                AND JSON_UNQUOTE(JSON_EXTRACT(p.datos, '$.maquina')) = :maquina_id
-                AND tdp.tipo_proceso NOT IN (6, 7, 9)
-                GROUP BY
-                    p.id, prod.nombre
-                ORDER BY
-                    CASE WHEN dias_restantes < 3 THEN 1 ELSE 2 END,
-                    dias_restantes ASC, p.prioridad_planeacion ASC;
-                """)
         async with self.engine.connect() as connection:
-            result = await connection.execute(query, {"maquina_id": maquina_id})
+            result = await connection.execute(SCHEDULABLE_ORDERS_FOR_MACHINE_SQL, {"maquina_id": maquina_id})
             orders_data = result.mappings().all()
             return [SchedulableOrderModel.model_validate(row) for row in orders_data]
         
     async def get_schedulable_orders_for_all_machines(self) -> List[SchedulableAllMachineModel]:
         """Ejecuta la consulta de planificación de todas las máquinas directamente en la base de datos."""
-        query = text("""
-            SELECT 
-                p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
-                p.prioridad_planeacion,
-                DATEDIFF(COALESCE(p.fecha_forzosa_entrega, p.fecha_entrega), CURDATE()) as dias_restantes,
-                prod.nombre as producto_nombre,
-                JSON_EXTRACT(p.datos, '$.cantidad') as cantidad,
-                JSON_EXTRACT(p.datos, '$.pantone') as colores,
-                JSON_LENGTH(JSON_EXTRACT(p.datos, '$.pantone')) as num_colores,
-                JSON_EXTRACT(p.datos, '$.materiales') as materiales,
-                SUM(e.peso_neto) as total_peso_neto,
-                SUM(e.metros_impresion) as total_metros_impresion,
-                COUNT(DISTINCT e.numero) as num_etiquetas,
-                -- Se usa JSON_UNQUOTE para obtener el valor limpio
-                JSON_UNQUOTE(JSON_EXTRACT(p.datos, '$.maquina')) as maquina_id
-            FROM pedido p
-            INNER JOIN productos prod ON p.producto_id = prod.id_producto
-            INNER JOIN tipos_de_productos tdp ON prod.id_tipo_producto = tdp.id_tipo_producto
-            INNER JOIN etiqueta e ON e.pedido_id = p.id AND e.etiqueta_para = 1 AND e.mostrar = 1 AND e.peso_neto > 0
-            WHERE p.status <= 5
-                AND JSON_VALID(p.datos)
-                -- NOTA: Esta lista de máquinas está hardcodeada. En el futuro, podría ser dinámica.
-                AND JSON_UNQUOTE(JSON_EXTRACT(p.datos, '$.maquina')) IN ('1','2','4','9','13','14','15','16','17')
-                AND tdp.tipo_proceso NOT IN (6, 7, 9)
-            -- El GROUP BY debe incluir todas las columnas no agregadas del SELECT.
-            GROUP BY 
-                p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
-                p.prioridad_planeacion, prod.nombre
-            ORDER BY 
-                maquina_id, dias_restantes ASC;
-        """)
         async with self.engine.connect() as connection:
             # Esta consulta no necesita parámetros
-            result = await connection.execute(query)
+            result = await connection.execute(SCHEDULABLE_ORDERS_FOR_ALL_MACHINES_SQL)
             orders_data = result.mappings().all()
             return [SchedulableAllMachineModel.model_validate(row) for row in orders_data]
         
@@ -404,33 +579,8 @@ class MySQLDB(BaseDatabase):
         Obtiene la cola de producción actual y la enriquece con datos de las tablas
         pedido, productos y etiqueta en una sola consulta optimizada.
         """
-        query = text("""
-            SELECT
-                p.id, p.producto_id, p.status, p.datos, p.fecha_entrega, p.fecha_forzosa_entrega,
-                p.prioridad_planeacion,
-                DATEDIFF(COALESCE(p.fecha_forzosa_entrega, p.fecha_entrega), CURDATE()) as dias_restantes,
-                prod.nombre as producto_nombre,
-                oias.id as id_en_cola, -- ID de la fila en la tabla de planificación (CRUCIAL)
-                oias.orden as order_production,
-                oias.probable_fecha_entrega,
-                oias.razon,
-                JSON_EXTRACT(p.datos, '$.cantidad') as cantidad,
-                JSON_EXTRACT(p.datos, '$.pantone') as colores,
-                JSON_LENGTH(JSON_EXTRACT(p.datos, '$.pantone')) as num_colores,
-                JSON_EXTRACT(p.datos, '$.materiales') as materiales,
-                SUM(e.peso_neto) as total_peso_neto,
-                SUM(e.metros_impresion) as total_metros_impresion,
-                COUNT(DISTINCT e.numero) as num_etiquetas
-            FROM orden_impresion_i_a_s oias
-            INNER JOIN pedido p ON oias.pedido_id = p.id
-            INNER JOIN productos prod ON p.producto_id = prod.id_producto
-            LEFT JOIN etiqueta e ON oias.pedido_id = e.pedido_id AND e.etiqueta_para = 1 AND e.mostrar = 1 AND e.peso_neto > 0
-            WHERE oias.maquina_id = :maquina_id
-            GROUP BY oias.id, p.id, prod.nombre
-            ORDER BY oias.orden ASC;
-        """)
         async with self.engine.connect() as connection:
-            result = await connection.execute(query, {"maquina_id": maquina_id})
+            result = await connection.execute(SCHEDULABLE_ORDERS_BY_MACHINE_QUEUE_SQL, {"maquina_id": maquina_id})
             orders_data = result.mappings().all()
         return [SchedulableOrderModel.model_validate(row) for row in orders_data]
 
@@ -442,10 +592,26 @@ class MySQLDB(BaseDatabase):
             await session.execute(delete_stmt)
 
             # 2. Insertar la nueva planificación
-            if new_schedule:
-                # Crea objetos ORM para la inserción en bloque
-                schedule_objects = [OrdenPedidoORM(**item) for item in new_schedule]
-                session.add_all(schedule_objects)
+            await OrdenPedidoORM.bulk_insert(session, new_schedule)
+
+            await session.commit()
+            return True
+
+    async def overwrite_all_schedules(self, schedules_by_machine: Dict[int, List[Dict[str, Any]]]) -> bool:
+        """
+        Reemplaza la planificación de varias máquinas en una sola transacción:
+        un único DELETE para todas las máquinas y una inserción masiva con todas las filas.
+        """
+        if not schedules_by_machine:
+            return True
+
+        async with self.async_session() as session:
+            # 1. Borrar la planificación antigua de todas las máquinas involucradas
+            delete_stmt = delete(OrdenPedidoORM).where(OrdenPedidoORM.machine_id.in_(list(schedules_by_machine)))
+            await session.execute(delete_stmt)
+
+            # 2. Insertar la nueva planificación combinada
+            await OrdenPedidoORM.bulk_insert(session, [row for schedule in schedules_by_machine.values() for row in schedule])
 
             await session.commit()
             return True
@@ -456,10 +622,8 @@ class MySQLDB(BaseDatabase):
             return True
 
         async with self.async_session() as session:
-            # Esta sintaxis es más explícita y segura para bulk updates.
-            # Le dice a SQLAlchemy que use 'id' para el WHERE y actualice el resto.
-            stmt = update(OrdenPedidoORM)
-            await session.execute(stmt, updates)
+            # 'id' va al WHERE y el resto de llaves se actualizan; en bloque a partir del umbral.
+            await OrdenPedidoORM.bulk_update_by_id(session, updates)
             await session.commit()
             return True
 
@@ -468,7 +632,7 @@ class MySQLDB(BaseDatabase):
         async with self.async_session() as session:
             # Verificar que la máquina y la orden existan
             machine_stmt = select(MachineORM).where(MachineORM.id == machine_id)
-            order_stmt = select(OrdenPedidoORM).where(OrdenPedidoORM.id == order_id)
+            order_stmt = select(OrdenPedidoORM).options(raiseload("*")).where(OrdenPedidoORM.id == order_id)
             
             machine_result = await session.execute(machine_stmt)
             order_result = await session.execute(order_stmt)
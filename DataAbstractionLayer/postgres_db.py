@@ -37,14 +37,15 @@ class PostgresDB(BaseDatabase):
             # return MachineModel.from_orm(machine_db) if machine_db else None
             pass # Placeholder
     
-    async def update_machine_status(self, machine_id: str, status: str, disabled_units: Optional[int] = None) -> bool:
-        """Actualiza el estado de una máquina en la base de datos real."""
+    async def update_machine_status(self, machine_id: str, status: Optional[str] = None, functional_inks: Optional[int] = None, inks_delta: Optional[int] = None) -> Optional[MachineModel]:
+        """Actualiza el estado y/o las unidades de una máquina en la base de datos real y devuelve la fila actualizada."""
         async with self.async_session() as session:
-            # Aquí iría tu lógica para actualizar un registro y hacer commit.
+            # Aquí iría tu lógica para actualizar un registro, hacer commit y releer la fila.
             # Ejemplo:
-            # await session.execute(update(Machine).where(Machine.id == machine_id).values(status=status))
+            # await session.execute(update(Machine).where(Machine.id == machine_id).values(estatus=status))
             # await session.commit()
-            return True # Placeholder
+            # return await self.get_machine_by_id(machine_id)
+            return None # Placeholder
     
     # ... Aquí implementarías el resto de los métodos abstractos de BaseDatabase
     # utilizando sesiones de SQLAlchemy para interactuar con la DB compartida.
@@ -1,8 +1,8 @@
 import logging
 from functools import lru_cache
 
-from core.config import settings
 from DataAbstractionLayer.base import BaseDatabase
+from DataAbstractionLayer.factory import create_db_instance
 from core.ports import AbstractLanguageAgent
 from core.adapters import OpenAIAgentAdapter
 from services.production_service import ProductionService
@@ -14,28 +14,12 @@ logger = logging.getLogger(__name__)
 @lru_cache(maxsize=None)
 def get_db_instance() -> BaseDatabase:
     """
-    Fábrica de instancias de la DAL.
-    Lee la configuración y devuelve la implementación de base de datos correcta.
+    Instancia de la DAL compartida por la API (una sola por proceso).
+    La construcción según la configuración vive en create_db_instance.
     Esto permite cambiar entre una DB en memoria y una DB compartida.
     """
     try:
-        if settings.DATABASE_TYPE == "mysql":
-            from DataAbstractionLayer.mysql_db import MySQLDB
-            logger.info("Usando implementación de base de datos: MySQL.")
-            # Se asegura de que la URL esté configurada (ya validado en config.py)
-            return MySQLDB(settings.DATABASE_URL)
-
-        if settings.DATABASE_TYPE == "postgres":
-                from DataAbstractionLayer.postgres_db import PostgresDB
-                logger.info("Usando implementación de base de datos: PostgreSQL.")
-                # Se asegura de que la URL esté configurada (ya validado en config.py)
-                return PostgresDB(settings.DATABASE_URL)
-    
-        # Por defecto, o si se especifica 'dummy', usa la base de datos en memoria.
-        from DataAbstractionLayer.dummy_db import DummyDB
-        logger.info("Usando implementación de base de datos: DummyDB (en memoria).")
-        return DummyDB()
-
+        return create_db_instance()
     except Exception as e:
         logger.error(f"Error al obtener la instancia de la base de datos: {str(e)}")
         raise e
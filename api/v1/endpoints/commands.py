@@ -1,5 +1,6 @@
 import logging
 
+from celery.result import AsyncResult
 from fastapi import APIRouter, HTTPException, Depends
 
 from schemas.api_models import CommandRequest, CommandResponse, HealthAgentResponse
@@ -9,6 +10,8 @@ from core.dispatcher import ToolDispatcher
 from api.v1.dependencies import get_agent_instance, get_tool_dispatcher
 from core.exceptions import BaseAppException, AgentError
 from core.config import settings
+from core.celery_app import celery_app
+from core.tasks import optimize_schedule_task
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -93,4 +96,52 @@ async def agent_status_check(agent: AbstractLanguageAgent = Depends(get_agent_in
                 "message": "El agente de IA no está conectado u operativo (servicio no disponible).",
                 "error": str(e)
             }
-        )
\ No newline at end of file
+        )
+
+@router.post(
+    "/schedule/{maquina_identifier}",
+    response_model=CommandResponse,
+    summary="Encola la planificación óptima de una máquina",
+    description="Envía la optimización a un worker de Celery y devuelve el ID de la tarea para consultarla después."
+)
+def enqueue_optimal_schedule(maquina_identifier: str):
+    # Endpoint síncrono: FastAPI lo ejecuta en el threadpool y el envío al broker no bloquea el event loop
+    task = optimize_schedule_task.delay(maquina_identifier)
+    logger.info(f"Optimización de la máquina '{maquina_identifier}' encolada con ID de tarea {task.id}")
+    return CommandResponse(
+        success=True,
+        message=f"Optimización de la máquina '{maquina_identifier}' encolada.",
+        action_executed="optimize_schedule",
+        data={"task_id": task.id}
+    )
+
+@router.get(
+    "/tasks/{task_id}",
+    response_model=CommandResponse,
+    summary="Consulta el estado de una tarea en segundo plano",
+    description="Devuelve el estado de la tarea de Celery y, si ya terminó, su resultado."
+)
+def get_task_status(task_id: str):
+    result = AsyncResult(task_id, app=celery_app)
+    status = result.state
+
+    if status == "SUCCESS":
+        return CommandResponse(
+            success=True,
+            message="La tarea finalizó correctamente.",
+            action_executed="get_task_status",
+            data={"task_id": task_id, "status": status, "result": result.result}
+        )
+    if status == "FAILURE":
+        return CommandResponse(
+            success=False,
+            message=f"La tarea falló: {result.result}",
+            action_executed="get_task_status",
+            data={"task_id": task_id, "status": status}
+        )
+    return CommandResponse(
+        success=True,
+        message="La tarea sigue en proceso.",
+        action_executed="get_task_status",
+        data={"task_id": task_id, "status": status}
+    )
@@ -3,11 +3,24 @@ import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Sequence, Union
 
+import numpy as np
 from pydantic import BaseModel, model_validator
 from schemas.db_models import SchedulableOrderModel, MachineModel, SchedulableOrdersFromMachine
 
 logger = logging.getLogger(__name__)
 
+def _minutos_a_microsegundos(minutos: List[float]) -> np.ndarray:
+    """
+    Convierte duraciones en minutos a microsegundos enteros con el mismo redondeo que timedelta(minutes=m):
+    los minutos enteros se escalan sin pérdida, solo la fracción pasa por aritmética flotante y el resto
+    se redondea a par respecto al total. Redondear directamente m * 60e6 difiere en 1 µs en algunos empates.
+    """
+    fraccion_min, enteros_min = np.modf(np.asarray(minutos, dtype=np.float64))
+    fraccion_us, enteros_us = np.modf(fraccion_min * 60e6)
+    total = enteros_min.astype(np.int64) * 60_000_000 + enteros_us.astype(np.int64)
+    ajuste = np.where(np.abs(fraccion_us) == 0.5, np.sign(fraccion_us) * (total & 1), np.round(fraccion_us))
+    return total + ajuste.astype(np.int64)
+
 # --- 1. MEJORA: Creamos una clase de configuración ---
 class PlannerConfig(BaseModel):
     """Configuración para el calculador de fechas."""
@@ -50,6 +63,9 @@ class DateCalculator:
             else:
                 self.minutos_laborables_por_dia[dia] = 0
 
+        # Jornada continua (24/7): el calendario no tiene huecos y las fechas se obtienen sumando minutos
+        self._jornada_continua = all(minutos == 1440 for minutos in self.minutos_laborables_por_dia.values())
+
     def _siguiente_dia_laboral(self, fecha: datetime) -> datetime:
         """Retorna el inicio del siguiente día laboral."""
         fecha_siguiente = (fecha + timedelta(days=1)).replace(hour=self.config.hora_inicio_turno1, minute=0, second=0)
@@ -67,7 +83,7 @@ class DateCalculator:
         minutos_restantes = minutos_a_sumar
 
         # Caso especial: si se trabaja 24/7, la lógica es mucho más simple.
-        if all(self.minutos_laborables_por_dia.get(d, 0) == 1440 for d in range(7)):
+        if self._jornada_continua:
             return fecha_actual + timedelta(minutes=minutos_restantes)
 
         # Bucle principal para consumir los minutos día por día
@@ -98,6 +114,27 @@ class DateCalculator:
         
         return fecha_actual
 
+    def _fechas_fin(self, fecha_inicio: datetime, duraciones: List[float]) -> List[datetime]:
+        """
+        Fecha de fin de cada orden, encadenando sus duraciones (en minutos) a partir de fecha_inicio.
+        En jornada continua es fecha_inicio más la suma acumulada, calculada de una vez con NumPy
+        en microsegundos (la resolución de timedelta) y con su mismo redondeo, así que coincide
+        exactamente con encadenar _ajustar_horario_laboral. Con huecos en el calendario se ajusta orden
+        por orden: cada salto de día conserva los segundos de la fecha en curso, así que el resultado
+        depende de dónde terminó la orden anterior.
+        """
+        # Con una sola orden no compensa preparar los arreglos: basta con el ajuste directo de abajo
+        if self._jornada_continua and len(duraciones) > 1:
+            acumulado_us = np.cumsum(_minutos_a_microsegundos(duraciones))
+            return (np.datetime64(fecha_inicio, "us") + acumulado_us.astype("timedelta64[us]")).tolist()
+
+        fechas_fin = []
+        fecha_acumulada = fecha_inicio
+        for duracion in duraciones:
+            fecha_acumulada = self._ajustar_horario_laboral(fecha_acumulada, duracion)
+            fechas_fin.append(fecha_acumulada)
+        return fechas_fin
+
     def _calcular_tiempo_cambio(
             self, 
             orden_anterior: Sequence[Union[SchedulableOrderModel, SchedulableOrdersFromMachine]], 
@@ -133,9 +170,11 @@ class DateCalculator:
         ) -> List[Dict]:
         """
         Función principal que calcula la fecha probable de entrega para cada orden. Ahora también retorna los tiempos desglosados para persistir en BD.
+        Primero se calcula la duración de cada orden y después, de una sola vez, las fechas de fin encadenadas.
         """
         ordenes_con_fechas = []
-        fecha_acumulada = fecha_inicio
+        duraciones = []
+        log_debug = logger.isEnabledFor(logging.DEBUG)
         
         for i, orden in enumerate(ordenes_secuenciadas):
             # --- PASO 1: Calcular duración total de esta orden ---
@@ -158,31 +197,20 @@ class DateCalculator:
             tiempo_impresion_teorico = (metros_totales / velocidad_m_min) if velocidad_m_min > 0 else 0
             tiempo_impresion_real = tiempo_impresion_teorico / self.config.eficiencia_maquina
             duracion_orden_minutos += tiempo_impresion_real
-            
-            # 1.4 Duración total sin buffer de seguridad
-            duracion_total_orden = tiempo_setup + tiempo_cambios_internos + tiempo_impresion_real
 
-            # 1.5 Buffer de seguridad (1%) se aplica a la duración de la orden actual, no al tiempo acumulado.
+            # 1.4 Buffer de seguridad (1%) se aplica a la duración de la orden actual, no al tiempo acumulado.
             tiempo_buffer = duracion_orden_minutos * self.config.buffer_seguridad_pct
             duracion_total_orden = duracion_orden_minutos + tiempo_buffer
 
-            # --- LOGGING CRÍTICO PARA DEBUG ---
-            logger.info(f"Orden {orden.id}: setup={tiempo_setup if i > 0 else 0:.1f}min, "
-                        f"cambios={tiempo_cambios_internos:.1f}min, "
-                        f"impresion={tiempo_impresion_real:.1f}min, "
-                        f"buffer={duracion_total_orden - duracion_orden_minutos:.1f}min, "
-                        f"TOTAL={duracion_total_orden:.1f}min ({duracion_total_orden/60:.1f}h)")
-            
-            # --- PASO 2: Calcular fecha probable ajustada al horario laboral ---
-            fecha_fin_orden = self._ajustar_horario_laboral(fecha_acumulada, duracion_total_orden)
+            # --- LOGGING PARA DEBUG ---
+            if log_debug:
+                logger.debug(f"Orden {orden.id}: setup={tiempo_setup:.1f}min, "
+                             f"cambios={tiempo_cambios_internos:.1f}min, "
+                             f"impresion={tiempo_impresion_real:.1f}min, "
+                             f"buffer={tiempo_buffer:.1f}min, "
+                             f"TOTAL={duracion_total_orden:.1f}min ({duracion_total_orden/60:.1f}h)")
 
-            # --- LOGGING DE FECHAS ---
-            logger.info(f"  Inicio: {fecha_acumulada.strftime('%Y-%m-%d %H:%M')} -> "
-                        f"Fin: {fecha_fin_orden.strftime('%Y-%m-%d %H:%M')}")
-            
-            # 6. Guardar resultados y actualizar la fecha para la siguiente iteración
             orden_dict = orden.model_dump()
-            orden_dict['probable_fecha_entrega'] = fecha_fin_orden
 
             # Campos desglosados para persistir en BD
             orden_dict['tiempo_setup_min'] = round(tiempo_setup, 2)
@@ -195,6 +223,15 @@ class DateCalculator:
             orden_dict['debug_num_etiquetas'] = num_etiquetas
 
             ordenes_con_fechas.append(orden_dict)
-            fecha_acumulada = fecha_fin_orden
+            duraciones.append(duracion_total_orden)
+
+        # --- PASO 2: Fechas probables ajustadas al horario laboral (cada orden empieza donde terminó la anterior) ---
+        fechas_fin = self._fechas_fin(fecha_inicio, duraciones)
+        for orden_dict, fecha_fin_orden in zip(ordenes_con_fechas, fechas_fin):
+            orden_dict['probable_fecha_entrega'] = fecha_fin_orden
+
+        if log_debug and fechas_fin:
+            logger.debug(f"  Inicio: {fecha_inicio.strftime('%Y-%m-%d %H:%M')} -> "
+                         f"Fin: {fechas_fin[-1].strftime('%Y-%m-%d %H:%M')}")
 
-        return ordenes_con_fechas
\ No newline at end of file
+        return ordenes_con_fechas
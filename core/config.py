@@ -40,6 +40,11 @@ class Settings(BaseSettings):
     # Database Settings -- Definir que implementación de la DAL se utilizará
     DATABASE_TYPE: str = "dummy"  # dummy, postgres, legacy
     DATABASE_URL: Optional[str] = None
+    # Pool de conexiones compartido por todos los requests del worker
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_TIMEOUT: int = 30  # segundos esperando una conexión libre
+    DB_POOL_RECYCLE: int = 1800  # segundos; menor que el wait_timeout de MySQL
 
     ## Development settings
     DEBUG: bool = False
@@ -1,7 +1,11 @@
 import random
 import json
 import logging
-from typing import Any, Dict, List, Set, Tuple
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+import orjson
 
 # --- LIBRERÍAS DEL ALGORITMO GENÉTICO ---
 from deap import base, creator, tools, algorithms
@@ -32,22 +36,58 @@ class OptimizerConfig:
     # Bonus por reutilización de colores
     COLOR_REUSE_BONUS: float = 15.0  # Descuento por cada color que se reutiliza
 
+    # Motor evolutivo (mu + lambda)
+    ELITE_SIZE: int = 5  # Mejores individuos que se reinyectan en cada generación
+    EARLY_STOP_GENERATIONS: int = 30  # Generaciones sin mejorar el mejor fitness antes de detenerse
+
+    # Tamaño de población y generaciones según el número de órdenes (ver `parametros_ag`)
+    POBLACION_MIN: int = 30
+    POBLACION_MAX: int = 200
+    GENERACIONES_MIN: int = 50
+    GENERACIONES_MAX: int = 400
+
+# Valores de columna que equivalen a "sin dato" o a una colección vacía (el caso más común):
+# se resuelven sin llamar al parser
+_EMPTY_JSON = frozenset({None, '', 'null', b'null', '[]', '[ ]', '{}'})
+
+@lru_cache(maxsize=100000)
+def _parsear_json_orden(
+    colores: Optional[str], materiales: Optional[str], datos: Optional[str]
+) -> Tuple[FrozenSet[str], FrozenSet[str], Any]:
+    """
+    Parsea las columnas JSON de una orden (colores, materiales, id_cliente).
+    Se memoiza por el contenido de las columnas: al reinstanciar el AG (p. ej. en cada
+    reoptimización por prioridad) las órdenes que no cambiaron no se vuelven a parsear.
+    Devuelve frozensets porque el resultado se comparte entre instancias.
+    """
+    try:
+        colores_set = frozenset(orjson.loads(colores)) if colores not in _EMPTY_JSON else frozenset()
+        materiales_set = frozenset(orjson.loads(materiales)) if materiales not in _EMPTY_JSON else frozenset()
+        datos_dict = orjson.loads(datos) if datos not in _EMPTY_JSON else {}
+        return colores_set, materiales_set, datos_dict.get('id_cliente')
+    except (orjson.JSONDecodeError, TypeError, AttributeError):
+        return frozenset(), frozenset(), None
+
 class EnrichedOrder:
     """Clase interna para evitar parsear JSON repetidamente."""
     def __init__(self, order: SchedulableOrderModel):
         self.original: SchedulableOrderModel = order
         self.id: int = order.id
         
-        # --- Pre-parseo de datos JSON ---
-        try:
-            self.colores: Set[str] = set(json.loads(order.colores)) if order.colores and order.colores != 'null' else set()
-            self.materiales: Set[str] = set(json.loads(order.materiales)) if order.materiales and order.materiales != 'null' else set()
-            datos_dict = json.loads(order.datos) if order.datos else {}
-            self.id_cliente: Any = datos_dict.get('id_cliente')
-        except (json.JSONDecodeError, TypeError):
-            self.colores = set()
-            self.materiales = set()
-            self.id_cliente = None
+        # --- Pre-parseo de datos JSON (memoizado por contenido en _parsear_json_orden) ---
+        self.colores: FrozenSet[str]
+        self.materiales: FrozenSet[str]
+        self.id_cliente: Any
+        self.colores, self.materiales, self.id_cliente = _parsear_json_orden(order.colores, order.materiales, order.datos)
+
+def parametros_ag(num_ordenes: int) -> Tuple[int, int]:
+    """
+    Devuelve (poblacion_size, generaciones) escalados al tamaño del problema: con pocas órdenes
+    una población de 100 por 200 generaciones es un desperdicio, y con cientos se queda corta.
+    """
+    poblacion = min(OptimizerConfig.POBLACION_MAX, max(OptimizerConfig.POBLACION_MIN, 4 * num_ordenes))
+    generaciones = min(OptimizerConfig.GENERACIONES_MAX, max(OptimizerConfig.GENERACIONES_MIN, 2 * num_ordenes))
+    return poblacion, generaciones
 
 def clasificar_urgencia(orden: SchedulableOrderModel) -> str:
     """Clasifica una orden por urgencia basado en sus días restantes."""
@@ -58,180 +98,355 @@ def clasificar_urgencia(orden: SchedulableOrderModel) -> str:
     elif dias <= 7: return 'PROXIMA'
     else: return 'NORMAL'
 
+# Peso de la penalización por minuto de retraso según la urgencia (ver `clasificar_urgencia`):
+# CRITICA_ATRASADA/ATRASADA (días < 0) y URGENTE (días <= 3); el resto usa DELAY_PENALTY_WEIGHT
+PESO_RETRASO_ATRASADA: float = 50.0
+PESO_RETRASO_URGENTE: float = 20.0
+
+# Tope de la penalización por retraso de una sola orden.
+# Esto evita que órdenes MUY atrasadas dominen completamente el fitness
+MAX_PENALIZACION_RETRASO: float = 500000.0
+
+def _cruce_ordenado(ind1: np.ndarray, ind2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cruce ordenado (OX) equivalente a `tools.cxOrdered`, pero operando sobre individuos ndarray.
+    Cada hijo recibe el segmento [a, b] del otro padre y completa el resto con sus propios
+    genes en el orden original, empezando después de b. Modifica ambos individuos en su lugar.
+    """
+    size = min(len(ind1), len(ind2))
+    if size < 2:
+        return ind1, ind2
+
+    a, b = random.sample(range(size), 2)
+    if a > b:
+        a, b = b, a
+
+    def _hijo(propio: np.ndarray, donante: np.ndarray) -> np.ndarray:
+        hijo = np.empty_like(propio)
+        hijo[a:b + 1] = donante[a:b + 1]
+        # Genes ya aportados por el segmento del donante (los "huecos" del OX clásico)
+        en_segmento = np.zeros(size, dtype=bool)
+        en_segmento[donante[a:b + 1]] = True
+        rotado = np.roll(propio, -(b + 1))
+        restantes = rotado[~en_segmento[rotado]]
+        hijo[(np.arange(restantes.size) + b + 1) % size] = restantes
+        return hijo
+
+    hijo1, hijo2 = _hijo(ind1, ind2), _hijo(ind2, ind1)
+    ind1[:] = hijo1
+    ind2[:] = hijo2
+    return ind1, ind2
+
+# --- TIPOS DE DEAP ---
+# `creator` los registra globalmente; crearlos en cada instancia del AG los reconstruye y emite
+# advertencias, así que se definen una sola vez al importar el módulo.
+# 1. Definir el tipo de problema: Minimizar un solo objetivo (el 'fitness score').
+if not hasattr(creator, "FitnessMin"):
+    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+# 2. Definir la estructura de un 'Individuo': un ndarray int32 con un atributo de fitness.
+# Con 4 bytes por gen (en lugar de un int de Python por posición) la población ocupa
+# mucha menos memoria y el cruce trabaja sobre bloques contiguos.
+if not hasattr(creator, "Individual"):
+    creator.create("Individual", np.ndarray, fitness=creator.FitnessMin)
+
+def _mutacion_intercambio(individuo: np.ndarray, indpb: float) -> Tuple[np.ndarray]:
+    """
+    Mutación por intercambio para individuos ndarray, totalmente vectorizada: cada posición se
+    selecciona con probabilidad `indpb` (máscara booleana) y los genes seleccionados rotan en
+    un ciclo aleatorio, así todas las posiciones elegidas cambian. Con dos posiciones equivale
+    a un intercambio; si solo se eligió una, se empareja con otra posición al azar, como en
+    `tools.mutShuffleIndexes`.
+    """
+    size = len(individuo)
+    if size < 2:
+        return individuo,
+
+    posiciones = np.flatnonzero(np.random.random(size) < indpb)
+    if posiciones.size == 0:
+        return individuo,
+    if posiciones.size == 1:
+        # Pareja uniforme en [0, size) excluyendo la propia posición
+        pareja = np.random.randint(0, size - 1)
+        pareja += pareja >= posiciones[0]
+        posiciones = np.append(posiciones, pareja)
+
+    ciclo = np.random.permutation(posiciones)
+    individuo[ciclo] = individuo[np.roll(ciclo, 1)]
+    return individuo,
+
+def _clonar_individuo(individuo: np.ndarray) -> np.ndarray:
+    """
+    Copia ligera de un individuo para `toolbox.clone`: duplica el buffer int32 y el fitness
+    sin pasar por la maquinaria genérica de `copy.deepcopy` (memo, despacho por tipo).
+    """
+    copia = np.ndarray.copy(individuo)
+    fitness = creator.FitnessMin()
+    fitness.wvalues = individuo.fitness.wvalues
+    copia.fitness = fitness
+    return copia
+
 class AlgoritmoGeneticoFlexo:
+    # Celdas de la matriz de transición calculadas por bloque en __init__
+    _CELDAS_POR_BLOQUE_TRANSICION = 1 << 20
+
     def __init__(self, ordenes: List[SchedulableOrderModel], maquina_info: MachineModel):
         self.ordenes_dict: Dict[int, EnrichedOrder] = {o.id: EnrichedOrder(o) for o in ordenes}
 
         # Mapa de índice a ID de pedido (ej. 0 -> 32766)
         self.idx_to_order_id: List[int] = [o.id for o in ordenes]
+        # El mismo mapa como arreglo, para traducir un individuo completo con una sola indexación
+        self._ids_por_idx = np.array(self.idx_to_order_id, dtype=np.int64)
         # Mapa inverso de ID de pedido a índice (ej. 32766 -> 0)
         self.order_id_to_idx: Dict[int, int] = {order_id: i for i, order_id in enumerate(self.idx_to_order_id)}
 
         self.maquina = maquina_info
         self.config = OptimizerConfig()
+
+        # --- CONSTANTES ESPECIALIZADAS PARA ESTA CORRIDA ---
+        # Los pesos de OptimizerConfig y los datos de la máquina no cambian durante la optimización,
+        # así que los productos derivados se pliegan una sola vez aquí y no en cada evaluación.
+        self._bonif_tintas_complejas = self.config.HIGH_INK_PRIORITY_WEIGHT
+        self._bonif_tintas_moderadas = self.config.HIGH_INK_PRIORITY_WEIGHT * 0.2
+        self._penal_tintas_simples = self.config.HIGH_INK_PRIORITY_WEIGHT * 0.5
+        self._tiempo_base_cambio = self.maquina.time_change_units or 15.0
+        self._costo_material_distinto = self._tiempo_base_cambio * self.config.MATERIAL_CHANGE_FACTOR
+        self._costo_material_igual = self._tiempo_base_cambio * self.config.MATERIAL_SAME_FACTOR
+
+        # --- ARREGLOS PRECALCULADOS POR ÍNDICE DE ORDEN ---
+        # La función de fitness trabaja con arreglos NumPy indexados por la posición de la orden,
+        # así cada evaluación es aritmética vectorizada en lugar de un ciclo con diccionarios y sets.
+        self._construir_arreglos([self.ordenes_dict[order_id] for order_id in self.idx_to_order_id])
+        self._construir_matriz_transicion()
         
         # --- CONFIGURACIÓN DE DEAP (AHORA TRABAJA CON ÍNDICES) ---
-        # 1. Definir el tipo de problema: Minimizar un solo objetivo (el 'fitness score').
-        creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
-        # 2. Definir la estructura de un 'Individuo': una lista con un atributo de fitness.
-        creator.create("Individual", list, fitness=creator.FitnessMin)
-
+        # 1 y 2. Los tipos FitnessMin e Individual se crean una sola vez a nivel de módulo.
         self.toolbox = base.Toolbox()
         # 3. Instrucciones para crear un individuo: una permutación aleatoria de los IDs de las órdenes.
         # El individuo ahora es una permutación de ÍNDICES (0, 1, 2, ...)
         num_items = len(self.idx_to_order_id)
-        self.toolbox.register("indices", random.sample, range(num_items), num_items)
-        self.toolbox.register("individual", tools.initIterate, creator.Individual, self.toolbox.indices)
+        self.toolbox.register("indices", lambda: np.random.permutation(num_items).astype(np.int32))
+        self.toolbox.register("individual", self._crear_individuo)
         # 4. Instrucciones para crear una población: una lista de N individuos.
         self.toolbox.register("population", tools.initRepeat, list, self.toolbox.individual)
+        # Clonado ligero: varOr clona a los padres de cada hijo en todas las generaciones
+        self.toolbox.register("clone", _clonar_individuo)
 
         # 5. Registrar los operadores genéticos
         self.toolbox.register("evaluate", self._evaluate_fitness)
-        self.toolbox.register("mate", tools.cxOrdered) # Crossover para secuencias
-        self.toolbox.register("mutate", tools.mutShuffleIndexes, indpb=0.05) # Mutación: intercambia algunas posiciones
+        self.toolbox.register("mate", _cruce_ordenado) # Crossover para secuencias (OX sobre ndarray)
+        self.toolbox.register("mutate", _mutacion_intercambio, indpb=0.05) # Mutación: intercambia algunas posiciones
         self.toolbox.register("select", tools.selTournament, tournsize=3) # Selección: el mejor de 3 competidores aleatorios
 
-    def _evaluate_fitness(self, individual_indices: List[int]) -> tuple[float,]:
+    def _construir_arreglos(self, enriquecidas: List[EnrichedOrder]) -> None:
         """
-        Calcula la 'calidad' de una secuencia de producción. Un valor más bajo es mejor.
-        DEAP requiere que el resultado sea una tupla.
+        Construye, en un solo recorrido de las órdenes, el layout de estructura de arreglos (SoA)
+        que usa la función de fitness: un arreglo contiguo por campo, con el dtype más compacto
+        que admite cada uno.
         """
-        score = 0.0
-        tiempo_acumulado_minutos = 0.0
-
-        # DEBUG: Para ver el score de las primeras 5 órdenes
-        # debug_info = []
-
-        for i, current_idx in enumerate(individual_indices):
-            current_order_id = self.idx_to_order_id[current_idx]
-            current_order = self.ordenes_dict[current_order_id]
-            if not current_order: continue
+        num_colores: List[int] = []
+        metros: List[float] = []
+        dias: List[float] = []
+        material_codigo: List[int] = []
+        cliente_codigo: List[int] = []
+        bits_por_orden: List[List[int]] = []
+
+        # Cada color distinto ocupa un bit; materiales y cliente se codifican como enteros
+        # para compararlos sin sets (-1 = sin cliente: no recibe la bonificación por mismo cliente).
+        # Solo un valor escalar identifica al cliente; una lista u objeto en 'datos' (JSON mal formado) cuenta como sin cliente.
+        colores_bit: Dict[str, int] = {}
+        materiales_idx: Dict[FrozenSet[str], int] = {}
+        clientes_idx: Dict[Any, int] = {}
+
+        for o in enriquecidas:
+            original = o.original
+            num_colores.append(len(o.colores))
+            metros.append(original.total_metros_impresion or 0.0)
+            dias.append(original.dias_restantes if original.dias_restantes is not None else np.nan)
+            material_codigo.append(materiales_idx.setdefault(o.materiales, len(materiales_idx)))
+            cliente_valido = o.id_cliente and isinstance(o.id_cliente, (str, int, float))
+            cliente_codigo.append(clientes_idx.setdefault(o.id_cliente, len(clientes_idx)) if cliente_valido else -1)
+            bits_por_orden.append([colores_bit.setdefault(color, len(colores_bit)) for color in o.colores])
+
+        self._num_colores = np.array(num_colores, dtype=np.int16)
+        # Minutos de producción estimados a partir de los metros totales.
+        # avg_velocity está en metros/HORA; se convierte a metros/minuto para ser consistente con el resto de los tiempos.
+        velocidad_metros_por_minuto = (self.maquina.avg_velocity or 0.0) / 60.0
+        if velocidad_metros_por_minuto:
+            self._tiempo_prod = np.array(metros, dtype=np.float64) / velocidad_metros_por_minuto
+        else:
+            self._tiempo_prod = np.zeros(len(metros), dtype=np.float64)
+        self._material_codigo = np.array(material_codigo, dtype=np.int32)
+        self._cliente_codigo = np.array(cliente_codigo, dtype=np.int32)
+
+        # Máscara de bits de colores por orden (64 colores por palabra uint64):
+        # las tintas compartidas entre dos órdenes son un AND + conteo de bits
+        num_palabras = max(1, -(-len(colores_bit) // 64))
+        self._mascara_colores = np.zeros((len(enriquecidas), num_palabras), dtype=np.uint64)
+        for i, bits in enumerate(bits_por_orden):
+            for bit in bits:
+                self._mascara_colores[i, bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+
+        # Días restantes (NaN = sin fecha). Las órdenes sin fecha nunca generan retraso (plazo infinito)
+        dias_restantes = np.array(dias, dtype=np.float64)
+        sin_fecha = np.isnan(dias_restantes)
+        self._plazo_minutos = np.where(sin_fecha, np.inf, dias_restantes * 1440)
+        # Peso por minuto de retraso según la urgencia, resuelto una sola vez por orden
+        self._peso_retraso = np.select(
+            [sin_fecha, dias_restantes < 0, dias_restantes <= 3],
+            [self.config.DELAY_PENALTY_WEIGHT, PESO_RETRASO_ATRASADA, PESO_RETRASO_URGENTE],
+            default=self.config.DELAY_PENALTY_WEIGHT
+        )
 
-            num_colores_orden = len(current_order.colores)
-            posicion_normalizada = i / len(individual_indices)
+        # Capacidad efectiva de tintas y penalización por excederla. Como cada individuo es una
+        # permutación de todas las órdenes, esta penalización no depende del orden: se suma fija.
+        self._functional_inks = self.maquina.functional_inks or self.maquina.inks
+        self._penal_sobrecapacidad = float(
+            np.maximum(self._num_colores - self._functional_inks, 0).sum() * self.config.INK_OVERCAPACITY_PENALTY
+        )
 
-            # score_antes = score  # Para debugging
+    def _construir_matriz_transicion(self) -> None:
+        """
+        Matriz de transición T[i, j]: costo de cambio de la orden i a la orden j.
+        Se calcula una sola vez (O(N²)) y cada evaluación solo hace lecturas T[anterior, actual].
+        Se llena por bloques de filas para acotar la memoria de los intermedios.
+        """
+        num_ordenes = len(self.idx_to_order_id)
+        todos = np.arange(num_ordenes)
+        filas_por_bloque = max(1, self._CELDAS_POR_BLOQUE_TRANSICION // max(1, num_ordenes))
+        self._matriz_transicion = np.empty((num_ordenes, num_ordenes), dtype=np.float64)
+        for inicio in range(0, num_ordenes, filas_por_bloque):
+            filas = todos[inicio:inicio + filas_por_bloque]
+            self._matriz_transicion[filas] = self._calcular_costos_cambio(filas[:, None], todos[None, :])
+
+    @staticmethod
+    def _como_individuo(permutacion: np.ndarray) -> np.ndarray:
+        """
+        Envuelve una permutación int32 como `creator.Individual` sin pasar por una lista intermedia
+        (el constructor de DEAP para ndarray convierte a lista y pierde el dtype).
+        """
+        individuo = permutacion.astype(np.int32, copy=False).view(creator.Individual)
+        individuo.fitness = creator.FitnessMin()
+        return individuo
 
-            # Para órdenes complejas (5+ colores): BONIFICAR si están al inicio
-            if num_colores_orden >= 5:
-                bonificacion = ((1 - posicion_normalizada) ** 2) * num_colores_orden * self.config.HIGH_INK_PRIORITY_WEIGHT
-                score -= bonificacion
-                # if i < 5:
-                #     debug_info.append(f"Pos {i}: Orden {current_order_id} ({num_colores_orden} colores) - BONIF: -{bonificacion:.0f}")
+    def _crear_individuo(self) -> np.ndarray:
+        return self._como_individuo(self.toolbox.indices())
 
-            # Para órdenes moderadas (3-4 colores): bonificación menor
-            elif num_colores_orden >= 3:
-                bonificacion = (1 - posicion_normalizada) * num_colores_orden * (self.config.HIGH_INK_PRIORITY_WEIGHT * 0.2)
-                score -= bonificacion
-                # if i < 5:
-                #     debug_info.append(f"Pos {i}: Orden {current_order_id} ({num_colores_orden} colores) - bonif: -{bonificacion:.0f}")
+    def _individuos_heuristicos(self) -> List[np.ndarray]:
+        """
+        Semillas para la población inicial a partir de reglas clásicas de secuenciación, para que
+        el AG no pierda las primeras generaciones redescubriéndolas:
+        - EDD: fecha de entrega más próxima primero (sin fecha al final)
+        - SPT / LPT: tiempo de producción más corto / más largo primero
+        - Vecino más cercano sobre la matriz de transición, iniciando por la orden con más tintas
+        """
+        semillas = [
+            np.argsort(self._plazo_minutos, kind='stable'),
+            np.argsort(self._tiempo_prod, kind='stable'),
+            np.argsort(-self._tiempo_prod, kind='stable'),
+        ]
 
-            # Para órdenes simples (1-2 colores): PENALIZAR si están al inicio
-            else:
-                penalizacion = (1 - posicion_normalizada) * (3 - num_colores_orden) * (self.config.HIGH_INK_PRIORITY_WEIGHT * 0.5)
-                score += penalizacion
-                # if i < 5:
-                #     debug_info.append(f"Pos {i}: Orden {current_order_id} ({num_colores_orden} colores) - PENAL: +{penalizacion:.0f}")
-
-            # Penalización por cambio de materiales y setup
-            if i > 0:
-                previous_idx = individual_indices[i-1]
-                previous_order_id = self.idx_to_order_id[previous_idx]
-                previous_order = self.ordenes_dict[previous_order_id]
-
-                costo_cambio = self._calcular_costo_cambio(previous_order, current_order)
-                score += costo_cambio * self.config.SETUP_COST_WEIGHT
-                tiempo_acumulado_minutos += costo_cambio
-
-                # if i < 5:
-                #     debug_info[-1] += f" | Setup: +{costo_cambio * self.config.SETUP_COST_WEIGHT:.0f}"
-
-            tiempo_prod = self._estimar_tiempo_produccion(current_order.original)
-            tiempo_acumulado_minutos += tiempo_prod
-
-            functional_inks = self.maquina.functional_inks or self.maquina.inks
-            if num_colores_orden > functional_inks:
-                score += (num_colores_orden - functional_inks) * self.config.INK_OVERCAPACITY_PENALTY
-
-            dias_entrega = current_order.original.dias_restantes
-            if dias_entrega is not None:
-                plazo_minutos = dias_entrega * 1440
-                if tiempo_acumulado_minutos > plazo_minutos:
-                    retraso_minutos = tiempo_acumulado_minutos - plazo_minutos
-                    urgencia = clasificar_urgencia(current_order.original)
-
-                    if urgencia in ['CRITICA_ATRASADA', 'ATRASADA']:
-                        peso_penalizacion = 50.0
-                    elif urgencia == 'URGENTE':
-                        peso_penalizacion = 20.0
-                    else:
-                        peso_penalizacion = self.config.DELAY_PENALTY_WEIGHT
-
-                    # Limitar la penalización máxima por retraso a 500k por orden
-                    # Esto evita que órdenes MUY atrasadas dominen completamente el fitness
-                    penalizacion_retraso = min(retraso_minutos * peso_penalizacion, 500000)
-                    score += penalizacion_retraso
-
-        # # DEBUG: Log solo ocasionalmente para no saturar
-        # if random.random() < 0.01:  # 1% de las evaluaciones
-        #     logger.info("=== SAMPLE FITNESS EVALUATION ===")
-        #     for info in debug_info:
-        #         logger.info(info)
-        #     logger.info(f"Score final: {score:.0f}")
-
-        return (score, )
-
-    def _calcular_costo_cambio(self, orden_anterior: EnrichedOrder, orden_actual: EnrichedOrder) -> float:
+        num_items = len(self.idx_to_order_id)
+        visitadas = np.zeros(num_items, dtype=bool)
+        actual = int(np.argmax(self._num_colores))
+        vecino_mas_cercano = [actual]
+        visitadas[actual] = True
+        for _ in range(num_items - 1):
+            costos = np.where(visitadas, np.inf, self._matriz_transicion[actual])
+            actual = int(np.argmin(costos))
+            vecino_mas_cercano.append(actual)
+            visitadas[actual] = True
+        semillas.append(np.array(vecino_mas_cercano))
+
+        return [self._como_individuo(semilla) for semilla in semillas]
+
+    def _evaluate_fitness(self, individual_indices: np.ndarray) -> tuple[float,]:
         """
-        Calcula un costo de transición detallado entre dos órdenes, usando datos pre-parseados,
-        enfocándose en la similitud de materiales y, sobre todo, de colores.
+        Calcula la 'calidad' de una secuencia de producción. Un valor más bajo es mejor.
+        DEAP requiere que el resultado sea una tupla.
+
+        Cada término se calcula para toda la secuencia a la vez sobre los arreglos precalculados.
         """
-        costo_total = 0.0
-        tiempo_base = self.maquina.time_change_units or 15.0
+        idx = np.asarray(individual_indices)
+        num_items = idx.size
+        num_colores = self._num_colores[idx]
+        factor_posicion = 1.0 - np.arange(num_items) / num_items
+
+        # 1. Prioridad por cantidad de tintas según la posición en la secuencia:
+        #    - Complejas (5+ colores): BONIFICAR si están al inicio
+        #    - Moderadas (3-4 colores): bonificación menor
+        #    - Simples (0-2 colores): PENALIZAR si están al inicio
+        prioridad_tintas = np.where(
+            num_colores >= 5,
+            -(factor_posicion ** 2) * num_colores * self._bonif_tintas_complejas,
+            np.where(
+                num_colores >= 3,
+                -factor_posicion * num_colores * self._bonif_tintas_moderadas,
+                factor_posicion * (3 - num_colores) * self._penal_tintas_simples
+            )
+        )
+        score = prioridad_tintas.sum()
 
-        try:
-            # 1. Costo por Material (ahora usa los sets pre-calculados)
-            if orden_anterior.materiales != orden_actual.materiales:
-                costo_total += tiempo_base * self.config.MATERIAL_CHANGE_FACTOR
-            else:
-                costo_total += tiempo_base * self.config.MATERIAL_SAME_FACTOR
+        # 2. Penalización por cambio de materiales y setup entre órdenes consecutivas
+        costos_cambio = self._matriz_transicion[idx[:-1], idx[1:]]
+        score += costos_cambio.sum() * self.config.SETUP_COST_WEIGHT
 
-            # 2. Costo por Tintas (ahora usa los sets pre-calculados)
-            tintas_a_quitar = orden_anterior.colores - orden_actual.colores
-            tintas_a_anadir = orden_actual.colores - orden_anterior.colores
-            tintas_reutilizadas = orden_anterior.colores & orden_actual.colores
+        # 3. Penalización por exceder las tintas funcionales de la máquina (precalculada)
+        score += self._penal_sobrecapacidad
 
-            # Penalización ALTA por cada tinta que se debe AÑADIR (estrategia "mala")
-            costo_total += len(tintas_a_anadir) * self.config.INK_ADD_COST
+        # 4. Penalización por retraso: al terminar cada orden se acumulan su producción y los cambios previos
+        tiempo_acumulado_minutos = np.cumsum(self._tiempo_prod[idx])
+        tiempo_acumulado_minutos[1:] += np.cumsum(costos_cambio)
+        retraso_minutos = tiempo_acumulado_minutos - self._plazo_minutos[idx]
+        atrasadas = retraso_minutos > 0
+        score += np.minimum(
+            retraso_minutos[atrasadas] * self._peso_retraso[idx[atrasadas]], MAX_PENALIZACION_RETRASO
+        ).sum()
 
-            # Penalización BAJA por cada tinta que se debe QUITAR (estrategia "buena")
-            costo_total += len(tintas_a_quitar) * self.config.INK_CLEAN_COST
+        return (float(score), )
 
-            # Bonus por cada tinta que se reutiliza (reduce el costo)
-            costo_total -= len(tintas_reutilizadas) * self.config.COLOR_REUSE_BONUS
+    def _calcular_costos_cambio(self, anteriores: np.ndarray, actuales: np.ndarray) -> np.ndarray:
+        """
+        Calcula el costo de transición de cada par (anterior -> actual), enfocándose en la
+        similitud de materiales y, sobre todo, de colores. Los arreglos de índices se combinan
+        con broadcasting, así sirve tanto para pares sueltos como para bloques de la matriz T.
+        """
+        # 1. Costo por Material
+        costos = np.where(
+            self._material_codigo[anteriores] != self._material_codigo[actuales],
+            self._costo_material_distinto,
+            self._costo_material_igual
+        )
 
-            # 3. Bonificación por Cliente (ahora usa el atributo pre-calculado)
-            if orden_anterior.id_cliente and orden_anterior.id_cliente == orden_actual.id_cliente:
-                costo_total *= self.config.SAME_CLIENT_BONUS_FACTOR
-            
-            # Asegurar que el costo nunca sea negativo
-            costo_total = max(0.0, costo_total)
+        # 2. Costo por Tintas
+        tintas_reutilizadas = np.bitwise_count(
+            self._mascara_colores[anteriores] & self._mascara_colores[actuales]
+        ).sum(axis=-1, dtype=np.float64)
+        tintas_a_anadir = self._num_colores[actuales] - tintas_reutilizadas
+        tintas_a_quitar = self._num_colores[anteriores] - tintas_reutilizadas
+
+        # Penalización ALTA por cada tinta que se debe AÑADIR (estrategia "mala"),
+        # BAJA por cada tinta que se debe QUITAR (estrategia "buena")
+        # y bonus por cada tinta que se reutiliza (reduce el costo)
+        costos = (
+            costos
+            + tintas_a_anadir * self.config.INK_ADD_COST
+            + tintas_a_quitar * self.config.INK_CLEAN_COST
+            - tintas_reutilizadas * self.config.COLOR_REUSE_BONUS
+        )
 
-        except (json.JSONDecodeError, TypeError) as e:
-            logger.warning(f"Error parseando JSON en costo de cambio: {e}")
-            return self.maquina.time_change_units or 15.0 # Fallback a un costo base
+        # 3. Bonificación por Cliente
+        cliente_anterior = self._cliente_codigo[anteriores]
+        mismo_cliente = (cliente_anterior >= 0) & (cliente_anterior == self._cliente_codigo[actuales])
+        costos = np.where(mismo_cliente, costos * self.config.SAME_CLIENT_BONUS_FACTOR, costos)
 
-        return costo_total
+        # Asegurar que el costo nunca sea negativo
+        return np.maximum(costos, 0.0)
     
-    def _estimar_tiempo_produccion(self, orden: SchedulableOrderModel) -> float:
-        """Estima minutos de producción usando los metros totales."""
-        if not orden.total_metros_impresion or not self.maquina.avg_velocity or self.maquina.avg_velocity == 0:
-            return 0
-        # avg_velocity está en metros/HORA, debemos convertirlo a minutos para que sea consistente con el resto de los cálculos de tiempo.
-        velocidad_metros_por_hora = self.maquina.avg_velocity
-        velocidad_metros_por_minuto = velocidad_metros_por_hora / 60.0
-        
-        return orden.total_metros_impresion / velocidad_metros_por_minuto
+    def _evaluar_invalidos(self, individuos: List[np.ndarray]) -> None:
+        """Evalúa (con el `map` registrado) solo los individuos cuyo fitness no es válido."""
+        invalidos = [ind for ind in individuos if not ind.fitness.valid]
+        for ind, fit in zip(invalidos, self.toolbox.map(self.toolbox.evaluate, invalidos)):
+            ind.fitness.values = fit
 
     def optimizar(self, poblacion_size=100, generaciones=100, cxpb=0.7, mutpb=0.2) -> List[int]:
         """
@@ -239,29 +454,50 @@ class AlgoritmoGeneticoFlexo:
 
         MEJORAS:
         - Aumentado tamaño de población y generaciones para mejor convergencia
+        - Esquema (mu + lambda) con élite y parada temprana (ver OptimizerConfig) en lugar de eaSimple,
+          que reemplazaba toda la población y corría todas las generaciones aunque ya hubiera convergido
+        - Población inicial sembrada con heurísticas (EDD, SPT, LPT, vecino más cercano)
         """
         logger.info(f"Iniciando optimización con AG global para {len(self.idx_to_order_id)} órdenes...")
         if not self.ordenes_dict:
             return []
         
-        pop = self.toolbox.population(n=poblacion_size)        
-        hof = tools.HallOfFame(1)        # Guardar el mejor individuo encontrado
+        # Población inicial: semillas heurísticas + permutaciones aleatorias
+        semillas = self._individuos_heuristicos()[:poblacion_size]
+        pop = self.toolbox.population(n=poblacion_size - len(semillas)) + semillas
+        hof = tools.HallOfFame(self.config.ELITE_SIZE, similar=np.array_equal)        # Guardar los mejores individuos encontrados
         
-        # Ejecutar el algoritmo
-        algorithms.eaSimple(
-            pop,
-            self.toolbox,
-            cxpb=cxpb, # Probabilidad de cruce
-            mutpb=mutpb, # Probabilidad de mutación
-            ngen=generaciones,
-            halloffame=hof,
-            verbose=False # Poner en True para ver el progreso en los logs
-        )
+        self._evaluar_invalidos(pop)
+        hof.update(pop)
+        mejor_fitness = hof[0].fitness.values[0]
+        generaciones_sin_mejora = 0
+
+        for generacion in range(1, generaciones + 1):
+            # Variación (mu + lambda): cada hijo sale de un cruce, una mutación o una copia
+            offspring = algorithms.varOr(pop, self.toolbox, lambda_=poblacion_size, cxpb=cxpb, mutpb=mutpb)
+            self._evaluar_invalidos(offspring)
+            hof.update(offspring)
+
+            # Selección sobre padres + hijos, reinyectando la élite para no perder a los mejores
+            elite = [self.toolbox.clone(ind) for ind in hof[:poblacion_size]]
+            pop[:] = self.toolbox.select(pop + offspring, poblacion_size - len(elite)) + elite
+
+            # Parada temprana cuando el mejor fitness deja de mejorar
+            if hof[0].fitness.values[0] < mejor_fitness:
+                mejor_fitness = hof[0].fitness.values[0]
+                generaciones_sin_mejora = 0
+            else:
+                generaciones_sin_mejora += 1
+                if generaciones_sin_mejora >= self.config.EARLY_STOP_GENERATIONS:
+                    logger.info(
+                        f"Parada temprana en la generación {generacion}/{generaciones}: "
+                        f"{generaciones_sin_mejora} generaciones sin mejora."
+                    )
+                    break
         
-        # El mejor individuo (hof[0]) es una lista de ÍNDICES.
+        # El mejor individuo (hof[0]) es un arreglo de ÍNDICES.
         # Lo traducimos de vuelta a una lista de IDs de pedido antes de devolverla.
-        best_sequence_indices = hof[0]
-        best_sequence_ids = [self.idx_to_order_id[idx] for idx in best_sequence_indices]
+        best_sequence_ids = self._ids_por_idx[hof[0]].tolist()
 
         logger.info(f"Optimización completada. Mejor fitness: {hof[0].fitness.values[0]}")
         
@@ -314,9 +550,9 @@ class GestorPrioridades:
             self.secuencia.remove(orden_id)
             return
         
-        # Mover al inicio
-        self.secuencia.remove(orden_id)
-        self.secuencia.insert(0, orden_id)
+        # Mover al inicio reconstruyendo la lista en un solo recorrido
+        # (remove + insert(0) desplazaban la lista completa dos veces)
+        self.secuencia = [orden_id] + [o_id for o_id in self.secuencia if o_id != orden_id]
         self.bloqueos[orden_id] = 'FORZADA'
         logger.info(f"Orden {orden_id} priorizada sin reprogramación (movida a posición 1).")
     
@@ -345,25 +581,23 @@ class GestorPrioridades:
             self.secuencia.remove(orden_id)
             return
         
-        # Remover la orden a priorizar de la secuencia
-        self.secuencia.remove(orden_id)
-        
-        # Identificar órdenes libres (no bloqueadas) para reoptimización
-        ordenes_libres_ids = [o_id for o_id in self.secuencia if o_id not in self.bloqueos]
-        
-        # VALIDACIÓN CRÍTICA: Filtrar órdenes que ya no pertenecen a esta máquina
-        # Esto es esencial para cuando se implemente la optimización multi-máquina
-        ordenes_libres_ids_validas = []
-        ordenes_removidas = []
-        
-        for o_id in ordenes_libres_ids:
-            if o_id in self.ordenes_dict:
+        # Particionar la secuencia en un solo recorrido (sin la orden a priorizar):
+        # - bloqueadas: se conservan en su posición relativa
+        # - libres: se reoptimizan
+        # - removidas: ya no pertenecen a esta máquina (VALIDACIÓN CRÍTICA para la optimización multi-máquina)
+        ordenes_bloqueadas: List[int] = []
+        ordenes_libres_ids_validas: List[int] = []
+        ordenes_removidas: List[int] = []
+
+        for o_id in self.secuencia:
+            if o_id == orden_id:
+                continue
+            if o_id in self.bloqueos:
+                ordenes_bloqueadas.append(o_id)
+            elif o_id in self.ordenes_dict:
                 ordenes_libres_ids_validas.append(o_id)
             else:
                 ordenes_removidas.append(o_id)
-                # Remover también de la secuencia principal
-                if o_id in self.secuencia:
-                    self.secuencia.remove(o_id)
         
         if ordenes_removidas:
             logger.warning(
@@ -381,14 +615,13 @@ class GestorPrioridades:
             )
             
             ag = AlgoritmoGeneticoFlexo(ordenes_libres_obj, self.maquina_info)
-            secuencia_nueva_optimizada = ag.optimizar(poblacion_size=100, generaciones=200)
+            poblacion_size, generaciones = parametros_ag(len(ordenes_libres_obj))
+            secuencia_nueva_optimizada = ag.optimizar(poblacion_size=poblacion_size, generaciones=generaciones)
         else:
             logger.info("No hay órdenes libres para reoptimizar.")
             secuencia_nueva_optimizada = []
         
         # Reconstruir la secuencia: bloqueadas + priorizada + optimizadas
-        ordenes_bloqueadas = [o_id for o_id in self.secuencia if o_id in self.bloqueos and o_id != orden_id]
-        
         self.secuencia = (
             ordenes_bloqueadas +
             [orden_id] +
@@ -412,35 +645,36 @@ class OptimizadorTotal:
             Dict[machine_id, Set[compatible_machine_ids]]
         """
         graph: Dict[int, Set[int]] = {m.id: set() for m in machines}
+        # Aristas dirigidas (origen, destino). Se recolectan en un solo recorrido, agregando
+        # la arista inversa en el momento para asegurar la SIMETRÍA y descartando los lazos
+        # (una máquina no se lista a sí misma como compatible).
+        aristas: Set[Tuple[int, int]] = set()
 
         for machine in machines:
             # Si la columna 'share_rolls' tiene datos
             if machine.share_rolls:
                 try:
-                    # Parsear el string JSON, que contiene una lista de IDs como strings.
-                    compatible_ids_str = json.loads(machine.share_rolls)
-                    # Convertir los IDs de string a entero.
-                    compatible_ids = {int(cid) for cid in compatible_ids_str}
-
-                    # Añadir las conexiones para la máquina actual
-                    graph[machine.id].update(compatible_ids)
-
-                    # --- LÓGICA CLAVE: ASEGURAR SIMETRÍA ---
-                    # Para cada máquina compatible, añadir una conexión de vuelta.
-                    for comp_id in compatible_ids:
-                        if comp_id in graph:
-                            graph[comp_id].add(machine.id)
-                
+                    # Parsear el string JSON, que contiene una lista de IDs como strings,
+                    # y convertir los IDs de string a entero.
+                    compatible_ids = {int(cid) for cid in json.loads(machine.share_rolls)}
                 except (json.JSONDecodeError, ValueError):
                     logger.warning(
                         f"No se pudo interpretar 'comparte_rodillos' para la máquina {machine.id}. "
                         f"Valor: '{machine.share_rolls}'"
                     )
-        
-        # Opcional: Limpiar el grafo para que una máquina no se liste a sí misma como compatible.
-        for machine_id, connections in graph.items():
-            connections.discard(machine_id)
-            
+                    continue
+
+                for comp_id in compatible_ids:
+                    if comp_id == machine.id:
+                        continue
+                    aristas.add((machine.id, comp_id))
+                    # Conexión de vuelta solo hacia máquinas conocidas
+                    if comp_id in graph:
+                        aristas.add((comp_id, machine.id))
+
+        for origen, destino in aristas:
+            graph[origen].add(destino)
+
         logger.info(f"Grafo de compatibilidad construido: {graph}")
         return graph
 
@@ -449,9 +683,11 @@ class OptimizadorTotal:
         orders_by_machine: Dict[int, List[SchedulableOrderModel]],
         machines: List[MachineModel],
         machine_graph: Dict[int, Set[int]]
-    ) -> List[Tuple[int, int, str]]:
+    ) -> List[Tuple[int, int, int, str]]:
         """
         Analiza las órdenes y sugiere reasignaciones entre máquinas compatibles.
+        Cada reasignación es (orden_id, maquina_origen_id, maquina_destino_id, razon): la máquina
+        origen ya se conoce aquí, así quien aplica los movimientos no tiene que buscarla.
         
         Dos fases separadas: 
             - Primero capacidad (crítico), luego balanceo (opcional)
@@ -516,6 +752,7 @@ class OptimizadorTotal:
                     if mejor_maquina:
                         reasignaciones.append((
                             orden.id,
+                            current_machine_id,
                             mejor_maquina,
                             f"Requiere {num_colores} tintas (actual: {functional_inks_current}, nueva: {mejor_capacidad})"
                         ))
@@ -584,6 +821,7 @@ class OptimizadorTotal:
                 if mejor_target:
                     reasignaciones.append((
                         orden.id,
+                        current_machine_id,
                         mejor_target,
                         f"Balanceo de carga (de {carga_actual} a {min_load} órdenes)"
                     ))
@@ -596,7 +834,7 @@ class OptimizadorTotal:
                     carga_actual -= 1  # Actualizar variable local también
 
         logger.info(f"Reasignaciones calculadas: {len(reasignaciones)} "
-                    f"({len([r for r in reasignaciones if 'Requiere' in r[2]])} por capacidad, "
-                    f"{len([r for r in reasignaciones if 'Balanceo' in r[2]])} por balanceo)")
+                    f"({len([r for r in reasignaciones if 'Requiere' in r[3]])} por capacidad, "
+                    f"{len([r for r in reasignaciones if 'Balanceo' in r[3]])} por balanceo)")
 
         return reasignaciones
\ No newline at end of file
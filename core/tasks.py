@@ -1,5 +1,8 @@
 import time
+import asyncio
 import logging
+from typing import Any, Dict
+
 from core.celery_app import celery_app
 # Las tareas pueden necesitar su propia instancia de la DAL para interactuar con la DB.
 # from dal.postgres_db import PostgresDB
@@ -26,3 +29,35 @@ def process_image_comparison_task(order_id: str, reference_image_path: str, prin
     
     logger.info(f"Comparación de imágenes para la orden {order_id} completada.")
     return {"order_id": order_id, "status": "completed", "similarity": 0.98}
+
+
+async def _generar_planificacion(maquina_identifier: str) -> Dict[str, Any]:
+    """
+    Ejecuta el flujo completo de planificación (carga, AG, fechas y guardado) con una DAL propia del worker.
+    El engine se crea y se libera dentro del mismo event loop de la tarea.
+    """
+    from DataAbstractionLayer.factory import create_db_instance
+    from services.scheduling_service import SchedulingService
+
+    # Misma configuración que la API (DATABASE_TYPE y DB_POOL_*), pero una instancia propia sin caché
+    db = create_db_instance()
+    try:
+        respuesta = await SchedulingService(db).generate_optimal_schedule(maquina_identifier)
+        return respuesta.model_dump(mode="json")
+    finally:
+        # La DummyDB en memoria no tiene engine que liberar
+        engine = getattr(db, "engine", None)
+        if engine is not None:
+            await engine.dispose()
+
+@celery_app.task(name="optimize_schedule")
+def optimize_schedule_task(maquina_identifier: str) -> Dict[str, Any]:
+    """
+    Genera la planificación óptima de una máquina en un worker de Celery.
+    El algoritmo genético tarda segundos; así no bloquea a los workers del servidor web.
+    Devuelve el `CommandResponse` serializado de `generate_optimal_schedule`.
+    """
+    logger.info(f"Iniciando optimización en segundo plano para la máquina: {maquina_identifier}")
+    resultado = asyncio.run(_generar_planificacion(maquina_identifier))
+    logger.info(f"Optimización en segundo plano para la máquina {maquina_identifier} completada.")
+    return resultado
@@ -1,5 +1,7 @@
+import asyncio
+import time
 import uvicorn
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Response
 from prometheus_fastapi_instrumentator import Instrumentator
 from fastapi.middleware.cors import CORSMiddleware
 from DataAbstractionLayer.base import BaseDatabase
@@ -46,6 +48,48 @@ async def root():
         "health_url": f"{settings.API_V1_STR}/health"
     }
 
+# --- Caché del health check ---
+# Los balanceadores consultan /health con mucha frecuencia. El resultado del ping a la base de datos
+# se reutiliza durante un TTL corto y, al expirar, solo un request hace el ping (los demás esperan el lock).
+HEALTH_CACHE_TTL_SECONDS = 2.0
+_health_cache = {"ts": 0.0, "ok": False, "error": None, "body": b""}
+
+def _health_lock() -> asyncio.Lock:
+    """
+    Lock del refresco del health check, guardado en app.state. Se crea de forma perezosa dentro del
+    event loop en curso (y se recrea si el loop cambia, p. ej. con varios TestClient o un reload):
+    un asyncio.Lock queda ligado al loop en el que se usa por primera vez.
+    """
+    loop = asyncio.get_running_loop()
+    if getattr(app.state, "health_lock_loop", None) is not loop:
+        app.state.health_lock = asyncio.Lock()
+        app.state.health_lock_loop = loop
+    return app.state.health_lock
+
+async def _verificar_db_con_cache(db: BaseDatabase) -> dict:
+    """Devuelve el último resultado de `check_connection`, refrescándolo si ya expiró."""
+    if time.monotonic() - _health_cache["ts"] < HEALTH_CACHE_TTL_SECONDS:
+        return _health_cache
+
+    async with _health_lock():
+        # Otro request pudo haber refrescado el caché mientras se esperaba el lock
+        if time.monotonic() - _health_cache["ts"] < HEALTH_CACHE_TTL_SECONDS:
+            return _health_cache
+        try:
+            await db.check_connection()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+        # El cuerpo "healthy" se serializa una sola vez por ciclo de verificación
+        body = HealthCheckResponse(
+            status="healthy",
+            database_status="connected",
+            database_type=settings.DATABASE_TYPE
+        ).model_dump_json().encode() if ok else b""
+        _health_cache.update(ts=time.monotonic(), ok=ok, error=error, body=body)
+
+    return _health_cache
+
 @app.get(
     "/health", 
     tags=["health"],
@@ -60,24 +104,21 @@ async def health_check(db: BaseDatabase = Depends(get_db_instance)):
     - Devuelve un estado general del sistema.
     """
     db_status = "connected"
-    try:
-        # Verificar conexión a la base de datos
-        await db.check_connection()
-    except Exception as e:
+    # Verificar conexión a la base de datos (resultado cacheado por unos segundos)
+    resultado = await _verificar_db_con_cache(db)
+    if not resultado["ok"]:
         db_status = "disconnected"
         raise HTTPException(
             status_code=503,
             detail={
                 "status": "unhealthy",
                 "database_status": db_status,
-                "error": str(e)
+                "error": resultado["error"]
             }
         )
-    return HealthCheckResponse(
-        status="healthy",
-        database_status=db_status,
-        database_type=settings.DATABASE_TYPE
-    )
+    # Respuesta pre-serializada: evita construir y validar el modelo en cada request.
+    # El timestamp corresponde a la última verificación real de la base de datos.
+    return Response(content=resultado["body"], media_type="application/json")
 
 # Bloque para ejecución en desarollo local
 if __name__ == "__main__":
@@ -1,42 +1,153 @@
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, Float, DateTime, func, Boolean, ForeignKey
+import logging
+
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, load_only
+from sqlalchemy import String, Integer, SmallInteger, Float, DateTime, func, ForeignKey, Index, CheckConstraint, insert, update, case, text
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, List, Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# A partir de cuántas filas conviene un INSERT en bloque en lugar de objetos ORM uno por uno
+BULK_INSERT_THRESHOLD = 100
+# Filas por sentencia en los INSERT en bloque
+BULK_INSERT_PAGE_SIZE = 1000
+# A partir de cuántas filas conviene un UPDATE con CASE por página en lugar del UPDATE por clave primaria del ORM
+BULK_UPDATE_THRESHOLD = 50
+# Filas por sentencia en las actualizaciones en bloque por id (cada columna lleva un CASE con una rama por fila)
+BULK_UPDATE_PAGE_SIZE = 500
+
+class Bool01(TypeDecorator):
+    """
+    Booleano almacenado como entero 0/1 (SMALLINT).
+    En Python se expone como bool; cada columna que lo use lleva su CHECK (col IN (0,1)).
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else int(bool(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else bool(value)
+
+class TimestampMixin:
+    """
+    Marcas de auditoría comunes a las tablas, generadas por el servidor (NOW() en la hora local
+    de la sesión de MySQL). OrdenPedido las redefine con defaults del cliente en UTC.
+    """
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
 
 # Clase base para nuestros modelos ORM
 class Base(DeclarativeBase):
-    pass
 
-class Machine(Base):
+    @classmethod
+    async def bulk_insert(cls, session: "AsyncSession", rows: List[Dict[str, Any]], page_size: int = BULK_INSERT_PAGE_SIZE) -> None:
+        """
+        Inserta muchas filas del modelo en la sesión dada.
+        Las filas son diccionarios con los nombres de atributo del ORM (ej. 'order_id', no 'pedido_id').
+        Por debajo del umbral se usa add_all; por encima, un INSERT ejecutado en bloque (executemany)
+        por cada página de `page_size` filas, que evita construir un objeto ORM por fila y acota
+        la memoria que el driver usa por sentencia.
+        """
+        if not rows:
+            return
+        if len(rows) < BULK_INSERT_THRESHOLD:
+            session.add_all([cls(**row) for row in rows])
+            return
+        stmt = insert(cls)
+        for inicio in range(0, len(rows), page_size):
+            await session.execute(stmt, rows[inicio:inicio + page_size])
+
+    @classmethod
+    async def bulk_update_by_id(cls, session: "AsyncSession", rows: List[Dict[str, Any]], page_size: int = BULK_UPDATE_PAGE_SIZE) -> None:
+        """
+        Actualiza muchas filas del modelo por su 'id' en la sesión dada.
+        Todas las filas traen las mismas llaves: 'id' más los atributos del ORM a escribir.
+        Por debajo del umbral se usa el UPDATE por clave primaria del ORM (una sentencia por fila
+        en el driver); por encima, un único UPDATE ... SET col = CASE id WHEN ... por cada página
+        de `page_size` filas, que reduce los viajes a la base de datos a uno por página.
+        """
+        if not rows:
+            return
+        if len(rows) < BULK_UPDATE_THRESHOLD:
+            await session.execute(update(cls), rows)
+            return
+        columnas = [getattr(cls, llave) for llave in rows[0] if llave != "id"]
+        for inicio in range(0, len(rows), page_size):
+            pagina = rows[inicio:inicio + page_size]
+            valores = {
+                columna: case({row["id"]: row[columna.key] for row in pagina}, value=cls.id)
+                for columna in columnas
+            }
+            stmt = (
+                update(cls)
+                .where(cls.id.in_([row["id"] for row in pagina]))
+                .values(valores)
+                .execution_options(synchronize_session=False)
+            )
+            await session.execute(stmt)
+
+class Machine(TimestampMixin, Base):
     """
     Representa la tabla de máquinas en la base de datos.
     """
     __tablename__ = "maquina"
+    __table_args__ = (
+        CheckConstraint("registro_exacto IN (0,1)", name="ck_machine_exact_register"),
+        CheckConstraint("tintas_funcionando <= numero_tintas", name="ck_machine_func_inks"),
+        CheckConstraint("tintas_funcionando >= 0", name="ck_machine_func_inks_pos"),
+        # Búsquedas por nombre o seudónimo (resolve_machine)
+        Index("ix_maquina_nombre", "nombre"),
+        Index("ix_maquina_seudonimo", "seudonimo"),
+    )
 
     id: Mapped[int] = mapped_column("id", Integer, primary_key=True)
 
     name: Mapped[str] = mapped_column("nombre", String(255))
-    created_at: Mapped[DateTime] = mapped_column("created_at", DateTime, server_default=func.now())
-    updated_at: Mapped[DateTime] = mapped_column("updated_at", DateTime, onupdate=func.now())
     rolls: Mapped[Optional[int]] = mapped_column("rodillos", Integer, nullable=True)
 
     max_width: Mapped[int] = mapped_column("ancho_maximo", Integer)
     inks: Mapped[int] = mapped_column("numero_tintas", Integer)
-    exact_register: Mapped[bool] = mapped_column("registro_exacto", Boolean)
+    exact_register: Mapped[bool] = mapped_column("registro_exacto", Bool01)
     plant: Mapped[int] = mapped_column("planta", Integer)
 
     pseudonym: Mapped[Optional[str]] = mapped_column("seudonimo", String(100), nullable=True)
-    share_rolls: Mapped[Optional[str]] = mapped_column("comparte_rodillos", nullable=True)
+    # Lista JSON con los ids de las máquinas que comparten rodillos, ej. "[2, 4]"
+    share_rolls: Mapped[Optional[str]] = mapped_column("comparte_rodillos", String(255), nullable=True)
     time_change_units: Mapped[float] = mapped_column("tiempo_cambio_unidad", Float)
     avg_velocity: Mapped[float] = mapped_column("velocidad_promedio", Float)
     estatus: Mapped[str] = mapped_column("estatus", String(50), default="activa")
     functional_inks: Mapped[int] = mapped_column("tintas_funcionando", Integer)
 
-class Mermas(Base):
+    # La cola completa de una máquina no se carga implícitamente: quien la necesite debe pedirla
+    # con selectinload(), así un listado de máquinas nunca arrastra todas sus órdenes.
+    orden_impresiones: Mapped[List["OrdenPedido"]] = relationship(back_populates="machine", lazy="raise")
+
+    @classmethod
+    def list_projection(cls):
+        """Columnas que consume MachineModel; deja fuera marcas de tiempo, rodillos y registro exacto."""
+        return load_only(
+            cls.id, cls.name, cls.max_width, cls.inks, cls.plant, cls.pseudonym, cls.share_rolls,
+            cls.time_change_units, cls.avg_velocity, cls.estatus, cls.functional_inks
+        )
+
+class Mermas(TimestampMixin, Base):
     """
     Representa la tabla de 'registro_mermas' en la base de datos.
     """
     __tablename__ = "registro_mermas"
+    __table_args__ = (
+        Index("ix_merma_pedido_proceso", "pedido_id", "proceso"),
+        Index("ix_merma_razon", "razon_id"),
+        # Consultas por pedido en una ventana reciente de tiempo
+        Index("ix_merma_pedido_fecha", "pedido_id", "created_at"),
+        CheckConstraint("cantidad >= 0", name="ck_merma_cantidad"),
+    )
 
     id: Mapped[int] = mapped_column("id", Integer, primary_key=True)
     order_id: Mapped[int] = mapped_column("pedido_id", Integer, nullable=False)
@@ -45,37 +156,34 @@ class Mermas(Base):
     quantity: Mapped[float] = mapped_column("cantidad", Float, nullable=False)
     observations: Mapped[Optional[str]] = mapped_column("observaciones", String(255), nullable=True)
     user_id: Mapped[int] = mapped_column("usuario_id", Integer, nullable=False)
-    created_at: Mapped[DateTime] = mapped_column("created_at", DateTime, server_default=func.now())
-    updated_at: Mapped[DateTime] = mapped_column("updated_at", DateTime, onupdate=func.now())
 
-class RazonMermas(Base):
+class RazonMermas(TimestampMixin, Base):
     """
     Representa la tabla de 'razon_mermas' en la base de datos.
     """
     __tablename__ = "razon_mermas"
+    __table_args__ = (CheckConstraint("activo IN (0,1)", name="ck_razon_active"),)
 
     id: Mapped[int] = mapped_column("id", Integer, primary_key=True)
     name: Mapped[str] = mapped_column("nombre", String(100))
     description: Mapped[Optional[str]] = mapped_column("descripcion", String(255), nullable=True)
-    active: Mapped[bool] = mapped_column("activo", Boolean, default=1)
-    created_at: Mapped[DateTime] = mapped_column("created_at", DateTime, server_default=func.now())
-    updated_at: Mapped[DateTime] = mapped_column("updated_at", DateTime, onupdate=func.now())
+    active: Mapped[bool] = mapped_column("activo", Bool01, server_default=text("1"))
 
-class Pedidos(Base):
+class Pedidos(TimestampMixin, Base):
     """
     Representa una parte de la tabla de 'pedido' en la base de datos.
     """
     __tablename__ = "pedido"
 
     id: Mapped[int] = mapped_column("id", Integer, primary_key=True)
-    created_at: Mapped[DateTime] = mapped_column("created_at", DateTime, server_default=func.now())
-    updated_at: Mapped[DateTime] = mapped_column("updated_at", DateTime, onupdate=func.now())
     user_id: Mapped[int] = mapped_column("usuario", Integer, nullable=False)
     product_id: Mapped[int] = mapped_column("producto_id", Integer, nullable=False)
     total_kg: Mapped[float] = mapped_column("cantidad", Float, nullable=False)
     status: Mapped[int] = mapped_column("status", Integer, nullable=False)
 
-class Productos(Base):
+    orden_impresiones: Mapped[List["OrdenPedido"]] = relationship(back_populates="pedido", lazy="raise")
+
+class Productos(TimestampMixin, Base):
     """
     Representa una parte de la tabla de 'productos' en la base de datos.
     """
@@ -84,53 +192,71 @@ class Productos(Base):
     id: Mapped[int] = mapped_column("id_producto", Integer, primary_key=True)
     product_type_id: Mapped[int] = mapped_column("id_tipo_producto", Integer, nullable=False)
     name: Mapped[str] = mapped_column("nombre", String(255), nullable=False)
-    created_at: Mapped[DateTime] = mapped_column("created_at", DateTime, server_default=func.now())
-    updated_at: Mapped[DateTime] = mapped_column("updated_at", DateTime, onupdate=func.now())
 
-class Etiqueta(Base):
+class Etiqueta(TimestampMixin, Base):
     """
     Representa una parte de la tabla de 'etiqueta' en la base de datos.
     """
     __tablename__ = "etiqueta"
+    # Cubre los SUM(peso_neto) por pedido filtrados por etiqueta_para y mostrar
+    __table_args__ = (
+        Index("ix_etiqueta_pedido", "pedido_id", "etiqueta_para", "mostrar"),
+        CheckConstraint("mostrar IN (0,1)", name="ck_etiqueta_show"),
+    )
 
     id: Mapped[int] = mapped_column("id", Integer, primary_key=True)
     gross_weight: Mapped[float] = mapped_column("peso_bruto", Float, nullable=False)
     net_weight: Mapped[float] = mapped_column("peso_neto", Float, nullable=False)
     purchase_id: Mapped[int] = mapped_column("compra_id", Integer, nullable=False)
     order_id: Mapped[int] = mapped_column("pedido_id", Integer, nullable=False)
-    created_at: Mapped[DateTime] = mapped_column("created_at", DateTime, server_default=func.now())
-    updated_at: Mapped[DateTime] = mapped_column("updated_at", DateTime, onupdate=func.now())
     user_id: Mapped[int] = mapped_column("usuario_id", Integer, nullable=False)
     label_for: Mapped[str] = mapped_column("etiqueta_para", String(100), nullable=False)
-    show: Mapped[bool] = mapped_column("mostrar", Boolean, default=True)
+    show: Mapped[bool] = mapped_column("mostrar", Bool01, server_default=text("1"))
     printing_meters: Mapped[float] = mapped_column("metros_impresion", Float, nullable=False)
 
-class SubEtiqueta1(Base):
+class SubEtiqueta1(TimestampMixin, Base):
     """
     Representa una parte de la tabla de 'sub_etiqueta_1' en la base de datos.
     """
     __tablename__ = "sub_etiqueta_1"
+    __table_args__ = (
+        Index("ix_sub_etiqueta_pedido", "pedido_id", "mostrar"),
+        CheckConstraint("mostrar IN (0,1)", name="ck_sub_etiqueta_show"),
+    )
 
     id: Mapped[int] = mapped_column("id", Integer, primary_key=True)
     net_weight_impression: Mapped[float] = mapped_column("peso_neto_impresion", Float, nullable=False)
-    created_at: Mapped[DateTime] = mapped_column("created_at", DateTime, server_default=func.now())
-    updated_at: Mapped[DateTime] = mapped_column("updated_at", DateTime, onupdate=func.now())
     user_id: Mapped[int] = mapped_column("usuario_id", Integer, nullable=False)
     order_id: Mapped[int] = mapped_column("pedido_id", Integer, nullable=False)
-    show: Mapped[bool] = mapped_column("mostrar", Boolean, default=True)
+    show: Mapped[bool] = mapped_column("mostrar", Bool01, server_default=text("1"))
 
-class OrdenPedido(Base):
+class OrdenPedido(TimestampMixin, Base):
     """Representa la tabla 'orden_impresion_i_a_s' que define la secuencia de producción."""
     __tablename__ = "orden_impresion_i_a_s"
+    # La cola de una máquina se lee como WHERE maquina_id = ? ORDER BY orden
+    __table_args__ = (
+        Index("ix_orden_machine_prod", "maquina_id", "orden"),
+        Index("ix_orden_pedido", "pedido_id"),
+    )
 
     id: Mapped[int] = mapped_column("id", Integer, primary_key=True)
     order_id: Mapped[int] = mapped_column("pedido_id", ForeignKey("pedido.id"))
     machine_id: Mapped[int] = mapped_column("maquina_id", ForeignKey("maquina.id"))
     order_production: Mapped[int] = mapped_column("orden", Integer, nullable=False)
-    reason: Mapped[Optional[str]] = mapped_column("razon", String(255), nullable=True)
+    # Texto libre que solo se consulta en detalle; se difiere para no viajar en cada lectura de la cola
+    reason: Mapped[Optional[str]] = mapped_column("razon", String(255), nullable=True, deferred=True)
     probable_delivery_date: Mapped[Optional[DateTime]] = mapped_column("probable_fecha_entrega", DateTime, nullable=False)
-    # Se reemplazan los defaults del servidor por defaults del cliente (Python).
-    # Usamos datetime.now(timezone.utc) para evitar problemas con zonas horarias.
+
+    # Nuevos campos para calculo de tiempo 
+    tiempo_setup_min: Mapped[Optional[float]] = mapped_column("tiempo_setup_min", Float, nullable=True, default=0.0)
+    tiempo_cambios_internos_min: Mapped[Optional[float]] = mapped_column("tiempo_cambios_internos_min", Float, nullable=True, default=0.0)
+    tiempo_impresion_min: Mapped[Optional[float]] = mapped_column("tiempo_impresion_min", Float, nullable=True, default=0.0)
+    tiempo_buffer_min: Mapped[Optional[float]] = mapped_column("tiempo_buffer_min", Float, nullable=True, default=0.0)
+    tiempo_total_min: Mapped[Optional[float]] = mapped_column("tiempo_total_min", Float, nullable=True, default=0.0)
+
+    # Se reemplazan los defaults del servidor del mixin por defaults del cliente (Python).
+    # Usamos datetime.now(timezone.utc) para evitar problemas con zonas horarias; también aplican
+    # a los INSERT y UPDATE en bloque (bulk_insert, bulk_update_by_id).
     created_at: Mapped[datetime] = mapped_column(
         "created_at",
         DateTime(timezone=True),
@@ -143,9 +269,28 @@ class OrdenPedido(Base):
         onupdate=lambda: datetime.now(timezone.utc) # Se ejecuta al actualizar
     )
 
-    # Nuevos campos para calculo de tiempo 
-    tiempo_setup_min: Mapped[Optional[float]] = mapped_column("tiempo_setup_min", Float, nullable=True, default=0.0)
-    tiempo_cambios_internos_min: Mapped[Optional[float]] = mapped_column("tiempo_cambios_internos_min", Float, nullable=True, default=0.0)
-    tiempo_impresion_min: Mapped[Optional[float]] = mapped_column("tiempo_impresion_min", Float, nullable=True, default=0.0)
-    tiempo_buffer_min: Mapped[Optional[float]] = mapped_column("tiempo_buffer_min", Float, nullable=True, default=0.0)
-    tiempo_total_min: Mapped[Optional[float]] = mapped_column("tiempo_total_min", Float, nullable=True, default=0.0)
\ No newline at end of file
+    # Relaciones muchos-a-uno: tampoco se cargan implícitamente (cargarían filas completas, sin proyección);
+    # quien las necesite debe pedirlas con selectinload() en su consulta.
+    machine: Mapped["Machine"] = relationship(back_populates="orden_impresiones", lazy="raise")
+    pedido: Mapped["Pedidos"] = relationship(back_populates="orden_impresiones", lazy="raise")
+
+    @classmethod
+    def schedule_projection(cls):
+        """Columnas que consume OrderModelforOrder para leer posiciones en la cola."""
+        return load_only(cls.id, cls.order_id, cls.machine_id, cls.order_production)
+
+
+def verificar_tipos_cacheables() -> List[str]:
+    """
+    Revisa que todos los TypeDecorator usados en los modelos declaren `cache_ok = True`.
+    Si alguno no lo hace, SQLAlchemy deja de cachear las sentencias compiladas de esa tabla;
+    se registran las columnas afectadas y se devuelven como 'tabla.columna'.
+    """
+    problemas = []
+    for mapper in Base.registry.mappers:
+        for columna in mapper.columns:
+            if isinstance(columna.type, TypeDecorator) and getattr(type(columna.type), "cache_ok", None) is not True:
+                problemas.append(f"{columna.table.name}.{columna.name}")
+    if problemas:
+        logger.warning(f"Tipos sin cache_ok=True (desactivan la caché de sentencias): {', '.join(problemas)}")
+    return problemas
@@ -1,5 +1,8 @@
+import asyncio
 import logging
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Optional, Iterable, Tuple
 from DataAbstractionLayer.base import BaseDatabase
 from typing import Union
 from schemas.api_models import CommandResponse, OrderStatusResponse, MachineStatusDetail, AllMachinesStatusResponse
@@ -7,6 +10,32 @@ from schemas.db_models import MachineModel
 
 logger = logging.getLogger(__name__)
 
+# Caché en proceso de máquinas resueltas: absorbe las búsquedas repetidas de la misma máquina
+# en ráfagas de comandos. El TTL corto acota cuánto puede tardar en verse un cambio hecho por otro proceso.
+MACHINE_CACHE_TTL_SECONDS = 1.0
+MACHINE_CACHE_MAX_SIZE = 256
+
+# Respuestas de error sin partes variables: se construyen una sola vez y se reutilizan.
+# Nadie modifica un CommandResponse después de devolverlo, así que compartir la instancia es seguro.
+EMPTY_IGNORE_RESPONSE = CommandResponse(
+    success=False, message="No se especificaron máquinas para poner en mantenimiento.", action_executed="ignore_machine", data=None
+)
+EMPTY_REACTIVATE_RESPONSE = CommandResponse(
+    success=False, message="No se especificaron máquinas para reactivar.", action_executed="reactivate_machine", data=None
+)
+NO_ACTIVE_MACHINES_RESPONSE = CommandResponse(
+    success=False, message="No se encontraron máquinas activas.", action_executed="query_machine_status", data=None
+)
+WASTE_NOT_CREATED_RESPONSE = CommandResponse(
+    success=False, message="No se pudo crear el registro de merma.", action_executed="register_waste", data=None
+)
+INVALID_UNITS_TO_DISABLE_RESPONSE = CommandResponse(
+    success=False, message="El número de unidades a deshabilitar debe ser mayor a 0.", action_executed="disable_machine_units", data=None
+)
+ROLL_WEIGHT_NOT_SAVED_RESPONSE = CommandResponse(
+    success=False, message="Error al guardar el registro del peso.", action_executed="register_roll_weight", data=None
+)
+
 class ProductionService:
     """
     Contiene la lógica de negocio (casos de uso) para las operaciones de producción.
@@ -14,46 +43,48 @@ class ProductionService:
     """
     def __init__(self, db: BaseDatabase):
         self.db = db
+        # identificador normalizado -> (instante de carga, máquina); el orden de inserción hace de LRU
+        self._machine_cache: "OrderedDict[str, Tuple[float, MachineModel]]" = OrderedDict()
+
+    async def _resolve_machine(self, identifier: str) -> Optional[MachineModel]:
+        """Resuelve una máquina por ID, nombre o seudónimo pasando primero por la caché con TTL."""
+        key = str(identifier).lower()
+        entry = self._machine_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < MACHINE_CACHE_TTL_SECONDS:
+            self._machine_cache.move_to_end(key)
+            return entry[1]
+
+        machine = await self.db.resolve_machine(str(identifier))
+        if machine is None:
+            self._machine_cache.pop(key, None)
+            return None
+
+        self._machine_cache[key] = (time.monotonic(), machine)
+        self._machine_cache.move_to_end(key)
+        if len(self._machine_cache) > MACHINE_CACHE_MAX_SIZE:
+            self._machine_cache.popitem(last=False)
+        return machine
+
+    def _invalidate_machines(self, machine_ids: Iterable[int]) -> None:
+        """Descarta de la caché todas las entradas (por cualquier identificador) de las máquinas modificadas."""
+        ids = set(machine_ids)
+        if not ids:
+            return
+        for key in [key for key, (_, machine) in self._machine_cache.items() if machine.id in ids]:
+            del self._machine_cache[key]
 
     async def ignore_machine(self, machine_ids: list[str]) -> CommandResponse: # Lista para producción
         """Lógica de negocio para poner una o más máquinas en mantenimiento."""
         try:
-            # Lista de rastreo para cada resultado
-            updated_machines = []
-            not_found_machines = []
-            already_in_maintenance = []
-
             if not machine_ids:
-                return CommandResponse(
-                    success=False, 
-                    message="No se especificaron máquinas para poner en mantenimiento.", 
-                    action_executed="ignore_machine", 
-                    data=None
-                )
-
-            for machine_id in machine_ids:
-                # Intenta buscar por ID primero, que es lo más eficiente.
-                machine = await self.db.get_machine_by_id(machine_id)
-
-                if not machine:
-                    # Si no se encuentra por ID, intenta buscar por nombre o seudónimo.
-                    machine = await self.db.get_machine_by_name_or_pseudonim(machine_id)
-
-                # Caso 1: La máquina no existe
-                if not machine:
-                    not_found_machines.append(machine_id)
-                    continue
-
-                # Caso 2: La máquina ya está en mantenimiento
-                if machine.estatus == "mantenimiento":
-                    already_in_maintenance.append(machine_id)
-                    continue
-                
-                # Caso 3: La máquina está en estado 'activo', se procede a ponerla en mantenimiento.
-                success = await self.db.update_machine_status(machine.id, status="mantenimiento")
-                if success:
-                    # Usamos el identificador original para el mensaje de respuesta, que es más amigable.
-                    updated_machines.append(machine_id)
+                return EMPTY_IGNORE_RESPONSE
+
+            # Una sola transacción resuelve, valida y actualiza todas las máquinas
+            resultado = await self.db.classify_and_update(machine_ids, "mantenimiento")
+            self._invalidate_machines(resultado["updated_ids"])
+            updated_machines = resultado["updated"]
+            already_in_maintenance = resultado["already"]
+            not_found_machines = resultado["not_found"]
             
             if not updated_machines and not not_found_machines:
                 return CommandResponse(
@@ -100,40 +131,15 @@ class ProductionService:
     async def reactivate_machine(self, machine_ids: list[str]) -> CommandResponse: # Lista para producción
         """Lógica de negocio para sacar una o más máquinas de mantenimiento."""
         try:
-            # Listas para rastrear el resultado de cada máquina
-            reactivated_machines = []
-            not_found_machines = []
-            already_active_machines = []
-
             if not machine_ids:
-                return CommandResponse(
-                    success=False, 
-                    message="No se especificaron máquinas para reactivar.", 
-                    action_executed="reactivate_machine", 
-                    data=None
-                )
-
-            for machine_id in machine_ids:
-                machine = await self.db.get_machine_by_id(machine_id)
-                
-                if not machine:
-                    # Si no se encuentra por ID, intenta buscar por nombre o seudónimo.
-                    machine = await self.db.get_machine_by_name_or_pseudonim(machine_id)
-
-                # Caso 1: La máquina no existe
-                if not machine:    
-                    not_found_machines.append(machine_id)
-                    continue
-            
-            # <-- VALIDACIÓN: Verifica si la máquina realmente está en mantenimiento.
-                if machine.estatus != "mantenimiento":
-                    already_active_machines.append(machine_id)
-                    continue
-
-                # Caso 2: La máquina existe y está en mantenimiento, se procede a reactivar.
-                success = await self.db.update_machine_status(machine.id, status="activa")
-                if success:
-                    reactivated_machines.append(machine_id)
+                return EMPTY_REACTIVATE_RESPONSE
+
+            # Solo se reactivan las que sigan en mantenimiento; todo en una sola transacción
+            resultado = await self.db.classify_and_update(machine_ids, "activa", from_status="mantenimiento")
+            self._invalidate_machines(resultado["updated_ids"])
+            reactivated_machines = resultado["updated"]
+            already_active_machines = resultado["already"]
+            not_found_machines = resultado["not_found"]
         
             # Construir un mensaje de respuesta claro y consolidado
             parts = []
@@ -173,11 +179,7 @@ class ProductionService:
         try:
             target_machine_id: Optional[int] = None
             if machine_identifier:
-                machine = None
-                if isinstance(machine_identifier, int) or machine_identifier.isdigit():
-                    machine = await self.db.get_machine_by_id(int(machine_identifier))
-                else:
-                    machine = await self.db.get_machine_by_name_or_pseudonim(machine_identifier)
+                machine = await self._resolve_machine(str(machine_identifier))
 
                 if not machine:
                     return CommandResponse(
@@ -188,27 +190,16 @@ class ProductionService:
                     )
                 target_machine_id = machine.id
 
-            # --- 1. Llamar al método "Todo en Uno" de la DAL ---
-            machine_details_from_db = await self.db.get_machines_status_with_details(target_machine_id)
-
-            if not machine_details_from_db:
-                return CommandResponse(
-                    success=False, 
-                    message="No se encontraron máquinas activas.",
-                    action_executed="query_machine_status",
-                    data=None
-                )
-
+            # --- 1. Leer en streaming el resultado del método "Todo en Uno" de la DAL ---
             # --- 2. Procesar los resultados y construir los objetos de respuesta ---
+            # Las filas vienen tipadas por la base de datos, así que se usa model_construct
+            # (sin re-validar cada campo); los valores DECIMAL se convierten explícitamente a float.
             machines_details_list = []
-            for row in machine_details_from_db:
+            async for row in self.db.stream_machines_status_with_details(target_machine_id):
                 current_order_data = None
                 # Si la consulta trajo información de un pedido (JOIN exitoso)
                 if row['pedido_id']:
-                    kilos_req = float(row['kilos_requeridos'])
-                    kilos_imp = float(row['kilos_impresos'])
-                    
-                    current_order_data = OrderStatusResponse(
+                    current_order_data = OrderStatusResponse.model_construct(
                         pedido_id=row['pedido_id'],
                         producto_nombre=row['producto_nombre'],
                         estatus_pedido=row['estatus_pedido'],
@@ -216,16 +207,19 @@ class ProductionService:
                         maquina_asignada_id=row['id'],
                         posicion_en_cola=row['posicion_en_cola'],
                         fecha_probable_entrega=row['probable_fecha_entrega'],
-                        kilos_requeridos=kilos_req,
-                        kilos_impresos=kilos_imp,
-                        porcentaje_progreso=round((100 * kilos_imp) / kilos_req, 1) if kilos_req > 0 else 0.0
+                        kilos_requeridos=float(row['kilos_requeridos']),
+                        kilos_impresos=float(row['kilos_impresos']),
+                        porcentaje_progreso=float(row['porcentaje_progreso'] or 0.0)
                     )
                 
-                machine_data = MachineModel.model_validate(row) # Pydantic mapeará los campos coincidentes
+                machine_data = MachineModel.model_construct(**row) # Toma los campos por su alias (columnas de la tabla)
                 machines_details_list.append(
-                    MachineStatusDetail(machine=machine_data, current_order=current_order_data)
+                    MachineStatusDetail.model_construct(machine=machine_data, current_order=current_order_data)
                 )
 
+            if not machines_details_list:
+                return NO_ACTIVE_MACHINES_RESPONSE
+
             # --- 3. Construir la respuesta final ---
             response_data = AllMachinesStatusResponse(
                 machines_count=len(machines_details_list),
@@ -257,13 +251,17 @@ class ProductionService:
         3. Crea el registro en la base de datos.
         """
         try:
+            # 1 y 2. Ambas búsquedas son independientes: se lanzan en paralelo (cada una usa su propia conexión del pool)
+            pedido, waste_reason = await asyncio.gather(
+                self.db.get_order_by_id(pedido_id),
+                self.db.get_waste_reason_by_name(reason)
+            )
+
             # 1. Validar que el pedido existe
-            pedido = await self.db.get_order_by_id(pedido_id)
             if not pedido:
                 return CommandResponse(success=False, message=f"El pedido con ID '{pedido_id}' no fue encontrado.")
 
             # 2. Validar que la razón de merma exista
-            waste_reason = await self.db.get_waste_reason_by_name(reason)
             if not waste_reason:
                 return CommandResponse(success=False, message=f"La razón de merma '{reason}' no se encontró o no está activa.")
 
@@ -281,7 +279,7 @@ class ProductionService:
                 message = f"Registrado desperdicio de {weight_kg}kg en el pedido {pedido.id} por '{waste_reason.name}'."
                 return CommandResponse(success=True, message=message, action_executed="register_waste", data=new_record)
 
-            return CommandResponse(success=False, message="No se pudo crear el registro de merma.", action_executed="register_waste", data=None)
+            return WASTE_NOT_CREATED_RESPONSE
 
         except Exception as e:
             return CommandResponse(
@@ -297,15 +295,13 @@ class ProductionService:
         y el estado actual de la máquina.
         """
         try:
-            # --- 1. Buscar la máquina ---
-            machine = None
-            if machine_id.isdigit():
-                # Intenta buscar por ID primero, que es lo más eficiente.
-                machine = await self.db.get_machine_by_id(machine_id)
+            # --- 1. Validar la entrada (no requiere consultar la base de datos) ---
+            if units_to_disable <= 0:
+                return INVALID_UNITS_TO_DISABLE_RESPONSE
 
-            # Si no se encuentra por ID, intenta buscar por nombre o seudónimo.
-            if not machine:
-                machine = await self.db.get_machine_by_name_or_pseudonim(machine_id)
+            # --- 2. Buscar la máquina (por ID, nombre o seudónimo en una sola consulta) ---
+            # Camino de escritura: se lee de la DB, no de la caché, para validar contra el estado actual
+            machine = await self.db.resolve_machine(str(machine_id))
 
             # Caso: La máquina no existe
             if not machine:
@@ -316,57 +312,49 @@ class ProductionService:
                     data=None
                 )
 
-            # --- 2. Validar la entrada y el estado actual --
-            if units_to_disable <= 0:
-                return CommandResponse(
-                    success=False,
-                    message=f"El número de unidades a deshabilitar debe ser mayor a 0.",
-                    action_executed="disable_machine_units",
-                    data=None
-                )
+            # Se leen una sola vez los campos que usan los mensajes y los cálculos
+            name, functional_inks = machine.name, machine.functional_inks
 
-            if machine.functional_inks == 0:
+            # --- 3. Validar el estado actual ---
+            if functional_inks == 0:
                 return CommandResponse(
                     success=True, 
-                    message=f"La máquina '{machine.name}' ya tiene todas sus unidades deshabilitadas.",
+                    message=f"La máquina '{name}' ya tiene todas sus unidades deshabilitadas.",
                     action_executed="disable_machine_units",
                     data=None
                 )
 
             # Comprueba si se intentan deshabilitar más unidades de las que están funcionando.
-            if units_to_disable > machine.functional_inks:
+            if units_to_disable > functional_inks:
                 return CommandResponse(
                     success=False,
                     message=(f"No se pueden deshabilitar {units_to_disable} unidades. "
-                                f"La máquina '{machine.name}' solo tiene {machine.functional_inks} funcionales en este momento."),
+                                f"La máquina '{name}' solo tiene {functional_inks} funcionales en este momento."),
                     action_executed="disable_machine_units",
                     data=None
                 )
 
-            # --- 3. Calcular y ejecutar la actualización ---
-            new_functional_inks = machine.functional_inks - units_to_disable
-            
-            success = await self.db.update_machine_status(
+            # --- 4. Ejecutar la actualización (la DB aplica el delta y los límites de forma atómica) ---
+            updated = await self.db.update_machine_status(
                 machine_id=machine.id,
-                functional_inks=new_functional_inks
+                inks_delta=-units_to_disable
             )
+            self._invalidate_machines([machine.id])
             
-            if success:
-                message = (f"Se deshabilitaron {units_to_disable} unidades en '{machine.name}'. "
-                            f"Ahora tiene {new_functional_inks}/{machine.inks} unidades funcionales.")
+            if updated:
                 return CommandResponse(
                     success=True, 
-                    message=message, 
-                    action_executed="disable_machine_units",
-                    data=None
-                )
-            else:
-                return CommandResponse(
-                    success=False, 
-                    message=f"No se pudieron actualizar las unidades de la máquina '{machine.name}'.",
+                    message=(f"Se deshabilitaron {functional_inks - updated.functional_inks} unidades en '{name}'. "
+                                f"Ahora tiene {updated.functional_inks}/{updated.inks} unidades funcionales."),
                     action_executed="disable_machine_units",
                     data=None
                 )
+            return CommandResponse(
+                success=False, 
+                message=f"No se pudieron actualizar las unidades de la máquina '{name}'.",
+                action_executed="disable_machine_units",
+                data=None
+            )
 
         except Exception as e:
             return CommandResponse(
@@ -383,13 +371,9 @@ class ProductionService:
         - Si se especifica un número, restaura esa cantidad de unidades.
         """
         try:
-            # --- 1. Búsqueda robusta de la máquina ---
-            machine = None
-            if machine_id.isdigit():
-                machine = await self.db.get_machine_by_id(int(machine_id))
-
-            if not machine:
-                machine = await self.db.get_machine_by_name_or_pseudonim(machine_id)
+            # --- 1. Búsqueda robusta de la máquina (por ID, nombre o seudónimo en una sola consulta) ---
+            # Camino de escritura: se lee de la DB, no de la caché, para validar contra el estado actual
+            machine = await self.db.resolve_machine(str(machine_id))
 
             if not machine:
                 return CommandResponse(
@@ -399,50 +383,43 @@ class ProductionService:
                     data=None
                 )
 
+            # Se leen una sola vez los campos que usan los mensajes y los cálculos
+            name, inks, functional_inks = machine.name, machine.inks, machine.functional_inks
+
             # --- 2. Validación del estado actual ---
-            if machine.functional_inks == machine.inks:
+            if functional_inks == inks:
                 return CommandResponse(
                     success=True,
-                    message=f"La máquina '{machine.name}' ya tiene todas sus {machine.inks} tintas funcionales.",
+                    message=f"La máquina '{name}' ya tiene todas sus {inks} tintas funcionales.",
                     action_executed="enable_machine_units",
                     data=None
                 )
 
-            # --- 3. Lógica de cálculo mejorada ---
-            currently_disabled = machine.inks - machine.functional_inks
-
-            if units_to_enable is None or units_to_enable <= 0:
-                # Caso por defecto: restaurar todas las unidades deshabilitadas.
-                units_to_restore = currently_disabled
-            else:
-                # Caso específico: restaurar un número, pero sin exceder el total de deshabilitadas.
-                units_to_restore = min(units_to_enable, currently_disabled)
-
-            # Calcula el nuevo número total de tintas funcionales.
-            new_functional_inks = machine.functional_inks + units_to_restore
+            # --- 3. Calcular el delta; la DB lo limita a numero_tintas ---
+            # Sin cantidad (o no positiva) se restauran todas: un delta de 'inks' siempre llega al máximo.
+            inks_delta = inks if units_to_enable is None or units_to_enable <= 0 else units_to_enable
 
             # --- 4. Llamada a la capa de datos ---
-            success = await self.db.update_machine_status(
+            updated = await self.db.update_machine_status(
                 machine_id=machine.id,
-                functional_inks=new_functional_inks
+                inks_delta=inks_delta
             )
+            self._invalidate_machines([machine.id])
 
-            if success:
-                message = (f"Se restauraron {units_to_restore} tintas en '{machine.name}'. "
-                            f"Ahora tiene {new_functional_inks}/{machine.inks} tintas funcionales.")
+            if updated:
                 return CommandResponse(
                     success=True, 
-                    message=message, 
-                    action_executed="enable_machine_units",
-                    data=None
-                )
-            else:
-                return CommandResponse(
-                    success=False, 
-                    message=f"No se pudieron restaurar las tintas de la máquina '{machine.name}'.",
+                    message=(f"Se restauraron {updated.functional_inks - functional_inks} tintas en '{name}'. "
+                                f"Ahora tiene {updated.functional_inks}/{updated.inks} tintas funcionales."),
                     action_executed="enable_machine_units",
                     data=None
                 )
+            return CommandResponse(
+                success=False, 
+                message=f"No se pudieron restaurar las tintas de la máquina '{name}'.",
+                action_executed="enable_machine_units",
+                data=None
+            )
 
         except Exception as e:
             return CommandResponse(
@@ -529,12 +506,7 @@ class ProductionService:
                     data=None
                 )
             else:
-                return CommandResponse(
-                    success=False, 
-                    message="Error al guardar el registro del peso.", 
-                    action_executed="register_roll_weight", 
-                    data=None
-                )
+                return ROLL_WEIGHT_NOT_SAVED_RESPONSE
 
         except Exception as e:
             return CommandResponse(
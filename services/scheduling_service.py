@@ -1,12 +1,16 @@
+import asyncio
 import logging
+import time
 from datetime import datetime
 from typing import List, Tuple, Dict, Union
 from collections import defaultdict
+from itertools import chain
+from operator import attrgetter, itemgetter
 
 from DataAbstractionLayer.base import BaseDatabase
-from schemas.db_models import SchedulableOrderModel
+from schemas.db_models import SchedulableOrderModel, SchedulableOrdersFromMachine, MachineModel
 from schemas.api_models import CommandResponse
-from core.optimizer import AlgoritmoGeneticoFlexo, GestorPrioridades, OptimizadorTotal
+from core.optimizer import AlgoritmoGeneticoFlexo, GestorPrioridades, OptimizadorTotal, parametros_ag
 from core.calculators import DateCalculator, PlannerConfig
 
 logger = logging.getLogger(__name__)
@@ -14,9 +18,58 @@ logger = logging.getLogger(__name__)
 # Se define el orden de prioridad en una constante para facilitar su mantenimiento.
 URGENCY_ORDER = ['CRITICA_ATRASADA', 'ATRASADA', 'URGENTE', 'PROXIMA', 'NORMAL']
 
+# Configuración del planificador, común a todas las máquinas. DateCalculator no guarda estado entre
+# llamadas a calcular_fechas_probables, así que una sola instancia se comparte (también entre hilos).
+_DEFAULT_PLANNER_CONFIG = PlannerConfig(
+    turnos_dia_semana=2, # Se trabajan 2 turnos
+    horas_por_turno_semana=12, # Cada turno dura 12 horas
+    dias_laborales=list(range(7)), # Lunes a Domingo
+    hora_inicio_turno1=8, # Los turnos empiezan a las 8am
+    turnos_sabado=2, # Se trabajan 2 turnos los sábados
+    horas_por_turno_sabado=12, # Cada turno del sábado dura 12 horas
+    eficiencia_maquina=0.95 # Ejemplo: esta máquina está al 95% de eficiencia
+)
+_DEFAULT_DATE_CALCULATOR = DateCalculator(config=_DEFAULT_PLANNER_CONFIG)
+
+# Columnas de cada registro de la cola (coinciden con el modelo ORM). Las últimas seis se copian
+# tal cual del resultado del calculador de fechas, extraídas de una sola vez con itemgetter.
+_SCHEDULE_KEYS = (
+    "order_id", "machine_id", "order_production", "reason", "probable_delivery_date",
+    "tiempo_setup_min", "tiempo_cambios_internos_min", "tiempo_impresion_min", "tiempo_buffer_min", "tiempo_total_min"
+)
+_get_fecha_y_tiempos = itemgetter(
+    "probable_fecha_entrega",
+    "tiempo_setup_min", "tiempo_cambios_internos_min", "tiempo_impresion_min", "tiempo_buffer_min", "tiempo_total_min"
+)
+
+# Un recálculo de fechas sobre la misma cola y la misma máquina solo movería las fechas lo que avanzó
+# el reloj; dentro de este TTL se reutilizan las fechas ya calculadas (se omite el cálculo, no la escritura:
+# otra petición o un worker pudo haber reescrito esas filas de la cola entre tanto).
+RECALC_CACHE_TTL_SECONDS = 30.0
+
+# Campos de cada orden en cola que determinan sus tiempos y la fila que se actualiza (firma del recálculo)
+_get_campos_recalculo = attrgetter(
+    "id", "id_en_cola", "num_etiquetas", "total_metros_impresion", "materiales", "num_colores", "datos"
+)
+
+# Columnas de la actualización de fechas de la cola (recalculate_delivery_dates); "id" es el id_en_cola.
+_QUEUE_UPDATE_KEYS = (
+    "id", "probable_delivery_date",
+    "tiempo_setup_min", "tiempo_cambios_internos_min", "tiempo_impresion_min", "tiempo_buffer_min", "tiempo_total_min"
+)
+
+def _filas_planificacion(machine_id: int, ordenes_con_fechas: List[Dict], razon_by_id: Dict[int, str]) -> List[Dict]:
+    """Construye los registros de la cola en el orden calculado (order_production empieza en 1)."""
+    return [
+        dict(zip(_SCHEDULE_KEYS, (oc["id"], machine_id, i, razon_by_id.get(oc["id"], "N/A"), *_get_fecha_y_tiempos(oc))))
+        for i, oc in enumerate(ordenes_con_fechas, start=1)
+    ]
+
 class SchedulingService:
     def __init__(self, db: BaseDatabase):
         self.db = db
+        # machine_id -> (instante del recálculo, firma de la cola, actualizaciones calculadas, respuesta)
+        self._last_recalc: Dict[int, Tuple[float, Tuple, List[Dict], CommandResponse]] = {}
 
     async def generate_optimal_schedule(self, maquina_identifier: str) -> CommandResponse:
         """
@@ -25,14 +78,11 @@ class SchedulingService:
         """
         try:
             # --- 1. Cargar Datos ---
-            machine_info = None
             maquina_identifier = maquina_identifier.strip() # limpiamos
 
-            # Intentar obtener la máquina por ID, nombre o seudónimo
-            if maquina_identifier.isdigit():
-                machine_info = await self.db.get_machine_by_id(int(maquina_identifier))
-            else:
-                machine_info = await self.db.get_machine_by_name_or_pseudonim(maquina_identifier)
+            # Máquina (por ID, nombre o seudónimo) y sus pedidos planificables en una sola llamada a la DAL;
+            # los pedidos solo se consultan si la máquina existe y está activa
+            machine_info, orders = await self.db.get_machine_and_orders(maquina_identifier)
 
             # Si aún no se encuentra, devolver error
             if not machine_info:
@@ -44,16 +94,13 @@ class SchedulingService:
                 )
             
             # Si la máquina no está activa, devolver error
-            if machine_info and machine_info.estatus != 'activa':
+            if machine_info.estatus != 'activa':
                 return CommandResponse(
                     success=False,
                     message=f"La máquina '{maquina_identifier}' no está activa.",
                     action_executed="generate_optimal_schedule",
                     data=None
                 )
-            
-            # Obtener todos los pedidos que pueden ser planificados en esta máquina
-            orders = await self.db.get_schedulable_orders_for_machine(machine_info.id)
 
             # Si no hay pedidos, devolver mensaje informativo
             if not orders:
@@ -74,22 +121,26 @@ class SchedulingService:
             logger.info(f"Se han apartado {len(ordenes_forzosas)} órdenes con fecha forzosa. Optimizando las {len(ordenes_optimizables)} restantes.")
 
             # --- 3. Optimización Global (Capa 2) ---
-            secuencia_optimizada_ids = []
-            if ordenes_optimizables:
-                # 3.1 -> Sin clasificar ya que son 1 o menos ordenes
-                if len(ordenes_optimizables) <= 1:
-                    logger.info("Añadiendo 1 o 0 órdenes optimizables sin AG.")
-                    secuencia_optimizada_ids = [o.id for o in ordenes_optimizables]
-                # 3.2 -> Clasificar con AG si son 2 o más órdenes
-                else:
-                    ag = AlgoritmoGeneticoFlexo(ordenes_optimizables, machine_info)
-                    secuencia_optimizada_ids = ag.optimizar(poblacion_size=100, generaciones=200)
-
-                    logger.info("=== DEBUG: Secuencia optimizada de órdenes (IDs) PRIMERAS 10 ORDENES ===")
+            # 3.1 -> Sin clasificar ya que son 1 o menos ordenes (con 0 la secuencia queda vacía)
+            if len(ordenes_optimizables) <= 1:
+                logger.info("Añadiendo 1 o 0 órdenes optimizables sin AG.")
+                secuencia_optimizada_ids = [o.id for o in ordenes_optimizables]
+            # 3.2 -> Clasificar con AG si son 2 o más órdenes
+            else:
+                # Construir el AG (matriz de transición) y optimizar es CPU puro: se ejecuta en un hilo
+                # para que el event loop siga atendiendo otras peticiones mientras tanto
+                ag = await asyncio.to_thread(AlgoritmoGeneticoFlexo, ordenes_optimizables, machine_info)
+                poblacion_size, generaciones = parametros_ag(len(ordenes_optimizables))
+                secuencia_optimizada_ids = await asyncio.to_thread(ag.optimizar, poblacion_size=poblacion_size, generaciones=generaciones)
+
+                # Solo se arma el detalle si el nivel DEBUG está activo
+                if logger.isEnabledFor(logging.DEBUG):
+                    optimizables_por_id = {o.id: o for o in ordenes_optimizables}
+                    logger.debug("=== DEBUG: Secuencia optimizada de órdenes (IDs) PRIMERAS 10 ORDENES ===")
                     for oid in secuencia_optimizada_ids[:10]:
-                        orden = next((o for o in ordenes_optimizables if o.id == oid), None)
+                        orden = optimizables_por_id.get(oid)
                         if orden:
-                            logger.info(f"Orden {orden.id}: metros={orden.total_metros_impresion}, "
+                            logger.debug(f"Orden {orden.id}: metros={orden.total_metros_impresion}, "
                                     f"colores={orden.colores}, "
                                     f"num_colores={orden.num_colores}, "
                                     f"materiales={orden.materiales}, "
@@ -97,60 +148,39 @@ class SchedulingService:
                                     f"cantidad={orden.cantidad}")
 
             # --- 4. Construir la Secuencia Final y Calcular Fechas ---
-            secuencia_final_con_razon: List[Tuple[int, str]] = []
-            # 4.1 -> Añadir las órdenes con fecha forzosa al inicio
+            # 4.1 -> Las órdenes con fecha forzosa al inicio
             razon_forzosa = "Prioridad absoluta por fecha forzosa."
-            secuencia_final_con_razon.extend([(o.id, razon_forzosa) for o in ordenes_forzosas])
-            
-            # 4.2 -> Añadir las órdenes optimizables clasificadas para optimizador genético
+            # 4.2 -> Después las optimizables clasificadas por el optimizador genético
             razon_optimizada = "Posición calculada por optimizador genético."
-            secuencia_final_con_razon.extend([(oid, razon_optimizada) for oid in secuencia_optimizada_ids])
+            # Una sola lista, sin listas intermedias por cada grupo
+            secuencia_final_con_razon: List[Tuple[int, str]] = list(chain(
+                ((o.id, razon_forzosa) for o in ordenes_forzosas),
+                ((oid, razon_optimizada) for oid in secuencia_optimizada_ids)
+            ))
+
+            # Razón por ID; setdefault conserva la primera aparición (las forzosas van antes)
+            razon_by_id: Dict[int, str] = {}
+            for pid, r in secuencia_final_con_razon:
+                razon_by_id.setdefault(pid, r)
 
             orders_dict = {o.id: o for o in orders}
             secuencia_ordenada_obj = [orders_dict[oid] for oid, razon in secuencia_final_con_razon]
 
-            # Configuración del planificador
-            planner_config = PlannerConfig(
-                turnos_dia_semana=2, # Se trabajan 2 turnos
-                horas_por_turno_semana=12, # Cada turno dura 12 horas
-                dias_laborales=list(range(7)), # Lunes a Domingo
-                hora_inicio_turno1=8, # Los turnos empiezan a las 8am
-                turnos_sabado=2, # Se trabajan 2 turnos los sábados
-                horas_por_turno_sabado=12, # Cada turno del sábado dura 12 horas
-                eficiencia_maquina=0.95 # Ejemplo: esta máquina está al 95% de eficiencia
-            )
-            logger.info("=== DEBUG: Primeras 2 órdenes ===")
-            for orden in secuencia_ordenada_obj[:2]:
-                logger.info(f"Orden {orden.id}: metros={orden.total_metros_impresion}, "
-                        f"etiquetas={orden.num_etiquetas}, "
-                        f"cantidad={orden.cantidad}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("=== DEBUG: Primeras 2 órdenes ===")
+                for orden in secuencia_ordenada_obj[:2]:
+                    logger.debug(f"Orden {orden.id}: metros={orden.total_metros_impresion}, "
+                            f"etiquetas={orden.num_etiquetas}, "
+                            f"cantidad={orden.cantidad}")
             
-            # 4.3 -> Instanciar y usar el calculador
-            calculator = DateCalculator(config=planner_config)
-
-            # Llamar a nuestro nuevo módulo de cálculo
+            # 4.3 -> Usar el calculador compartido del módulo
             fecha_inicio_planificacion = datetime.now() # O una fecha configurable
-            ordenes_con_fechas = calculator.calcular_fechas_probables(secuencia_ordenada_obj, fecha_inicio_planificacion, machine_info)
+            ordenes_con_fechas = await asyncio.to_thread(
+                _DEFAULT_DATE_CALCULATOR.calcular_fechas_probables, secuencia_ordenada_obj, fecha_inicio_planificacion, machine_info
+            )
 
             # --- 5. Guardar la Nueva Planificación (con nombres corregidos) ---
-            new_schedule_for_db = []
-            for i, orden_calculada in enumerate(ordenes_con_fechas, start=1):
-                
-                # Usar las claves que coinciden con el modelo ORM
-                new_schedule_for_db.append({
-                    "order_id": orden_calculada["id"],
-                    "machine_id": machine_info.id,
-                    "order_production": i, 
-                    "reason": next((r for pid, r in secuencia_final_con_razon if pid == orden_calculada['id']), "N/A"),
-                    "probable_delivery_date": orden_calculada["probable_fecha_entrega"],
-                    
-                    # Agregar tiempos desglosados
-                    "tiempo_setup_min": orden_calculada["tiempo_setup_min"],
-                    "tiempo_cambios_internos_min": orden_calculada["tiempo_cambios_internos_min"],
-                    "tiempo_impresion_min": orden_calculada["tiempo_impresion_min"],
-                    "tiempo_buffer_min": orden_calculada["tiempo_buffer_min"],
-                    "tiempo_total_min": orden_calculada["tiempo_total_min"]
-                })
+            new_schedule_for_db = _filas_planificacion(machine_info.id, ordenes_con_fechas, razon_by_id)
             
             success = await self.db.overwrite_machine_schedule(machine_info.id, new_schedule_for_db)
             
@@ -222,6 +252,9 @@ class SchedulingService:
 
             logger.info(f"Se encontraron {len(all_schedulable_orders)} órdenes planificables en total.")
 
+            # Índice global por ID de orden: lo comparten la reasignación y la optimización de cada máquina
+            global_orders_by_id = {o.id: o for o in all_schedulable_orders}
+
             # --- 3. Construir el grafo de compatibilidad entre máquinas ---
             ot = OptimizadorTotal()
             machine_graph = ot._build_machine_compatibility_graph(active_machines)
@@ -247,47 +280,36 @@ class SchedulingService:
             if reasignaciones:
                 logger.info(f"Aplicando {len(reasignaciones)} reasignaciones...")
 
-                # Aplicar reasignaciones de manera eficiente
-                reasignaciones_por_origen = {}
-                for orden_id, nueva_maquina_id, razon in reasignaciones:
-                    # Encontrar la máquina origen
-                    origen = None
-                    for maq_id, ordenes in orders_by_machine.items():
-                        if any(o.id == orden_id for o in ordenes):
-                            origen = maq_id
-                            break
-                        
-                    if origen:
-                        if origen not in reasignaciones_por_origen:
-                            reasignaciones_por_origen[origen] = []
-                        reasignaciones_por_origen[origen].append((orden_id, nueva_maquina_id, razon))
+                # Cada reasignación ya trae su máquina origen: se agrupan sin buscarla
+                reasignaciones_por_origen = defaultdict(list)
+                for orden_id, origen_id, nueva_maquina_id, razon in reasignaciones:
+                    reasignaciones_por_origen[origen_id].append((orden_id, nueva_maquina_id, razon))
+
+                # Durante los movimientos cada máquina guarda sus órdenes en un dict por ID (conserva el orden
+                # de inserción): sacar una orden del origen es un pop O(1) en lugar de list.remove
+                ordenes_por_maquina = {mid: {o.id: o for o in ords} for mid, ords in orders_by_machine.items()}
 
                 # Aplicar reasignaciones agrupadas por máquina origen
                 for origen_id, movimientos in reasignaciones_por_origen.items():
-                    ordenes_origen = orders_by_machine[origen_id]
-                    ordenes_a_mover = []
+                    ordenes_origen = ordenes_por_maquina[origen_id]
 
                     for orden_id, destino_id, razon in movimientos:
-                        orden = next((o for o in ordenes_origen if o.id == orden_id), None)
+                        orden = ordenes_origen.pop(orden_id, None)
                         if orden:
-                            ordenes_a_mover.append((orden, destino_id, razon))
+                            ordenes_por_maquina.setdefault(destino_id, {})[orden_id] = orden
+                            logger.info(f"Orden {orden.id}: {origen_id} → {destino_id} ({razon})")
 
-                    # Remover todas las órdenes a mover de origen
-                    for orden, _, _ in ordenes_a_mover:
-                        ordenes_origen.remove(orden)
-
-                    # Agregar a destinos
-                    for orden, destino_id, razon in ordenes_a_mover:
-                        if destino_id not in orders_by_machine:
-                            orders_by_machine[destino_id] = []
-                        orders_by_machine[destino_id].append(orden)
-                        logger.info(f"Orden {orden.id}: {origen_id} → {destino_id} ({razon})")
+                # De vuelta a listas, que es lo que consume la FASE 2
+                orders_by_machine = {mid: list(ords.values()) for mid, ords in ordenes_por_maquina.items()}
 
                 logger.info(f"Reasignaciones completadas.")
 
             # --- 6. FASE 2: Optimizar cada máquina individualmente ---
-            all_schedules = []
+            # El AG y el cálculo de fechas son CPU puro: cada máquina se optimiza en un hilo
+            # aparte para no bloquear el event loop, y todas avanzan a la vez.
             machines_dict = {m.id: m for m in active_machines}
+            machine_ids = []
+            tareas = []
 
             for machine_id, ordenes in orders_by_machine.items():
                 if not ordenes:
@@ -298,77 +320,20 @@ class SchedulingService:
                 if not machine_info:
                     logger.warning(f"No se encontró información para máquina {machine_id}.")
                     continue
-                
-                # Separar órdenes forzosas vs optimizables
-                ordenes_forzosas = sorted(
-                    [o for o in ordenes if o.fecha_forzosa_entrega is not None], 
-                    key=lambda o: o.fecha_forzosa_entrega
-                )
-                ordenes_optimizables = [o for o in ordenes if o.fecha_forzosa_entrega is None]
-
-                logger.info(
-                    f"Máquina {machine_id}: {len(ordenes_forzosas)} forzosas, "
-                    f"{len(ordenes_optimizables)} optimizables."
-                )
-
-                # Optimizar las órdenes no forzosas
-                secuencia_optimizada_ids = []
-                if ordenes_optimizables:
-                    if len(ordenes_optimizables) <= 1:
-                        secuencia_optimizada_ids = [o.id for o in ordenes_optimizables]
-                    else:
-                        ag = AlgoritmoGeneticoFlexo(ordenes_optimizables, machine_info)
-                        secuencia_optimizada_ids = ag.optimizar(poblacion_size=100, generaciones=200)
-
-                # Construir secuencia final con razones
-                secuencia_final_con_razon = []
-                razon_forzosa = "Prioridad absoluta por fecha forzosa."
-                secuencia_final_con_razon.extend([(o.id, razon_forzosa) for o in ordenes_forzosas])
-
-                razon_optimizada = "Posición calculada por optimizador genético global."
-                secuencia_final_con_razon.extend([(oid, razon_optimizada) for oid in secuencia_optimizada_ids])
-
-                # Calcular fechas probables
-                orders_dict = {o.id: o for o in ordenes}
-                secuencia_ordenada_obj = [orders_dict[oid] for oid, _ in secuencia_final_con_razon]
-
-                planner_config = PlannerConfig(
-                    turnos_dia_semana=2,
-                    horas_por_turno_semana=12,
-                    dias_laborales=list(range(7)),
-                    hora_inicio_turno1=8,
-                    turnos_sabado=2,
-                    horas_por_turno_sabado=12,
-                    eficiencia_maquina=0.95
-                )
 
-                calculator = DateCalculator(config=planner_config)
-                fecha_inicio = datetime.now()
-                ordenes_con_fechas = calculator.calcular_fechas_probables(
-                    secuencia_ordenada_obj, 
-                    fecha_inicio, 
-                    machine_info
-                )
+                machine_ids.append(machine_id)
+                tareas.append(asyncio.to_thread(self._optimize_single_machine, machine_info, ordenes, global_orders_by_id))
 
-                # Preparar para guardar
-                for i, orden_calculada in enumerate(ordenes_con_fechas, start=1):
-                    all_schedules.append({
-                        "order_id": orden_calculada["id"],
-                        "machine_id": machine_id,
-                        "order_production": i,
-                        "reason": next((r for pid, r in secuencia_final_con_razon if pid == orden_calculada['id']), "N/A"),
-                        "probable_delivery_date": orden_calculada["probable_fecha_entrega"],
-
-                        # Tiempos desglosados
-                        "tiempo_setup_min": orden_calculada["tiempo_setup_min"],
-                        "tiempo_cambios_internos_min": orden_calculada["tiempo_cambios_internos_min"],
-                        "tiempo_impresion_min": orden_calculada["tiempo_impresion_min"],
-                        "tiempo_buffer_min": orden_calculada["tiempo_buffer_min"],
-                        "tiempo_total_min": orden_calculada["tiempo_total_min"]
-                    })
+            # Planificación agrupada por máquina desde el origen (sin lista plana que filtrar después)
+            schedules_by_machine: Dict[int, List[Dict]] = {
+                machine_id: schedule
+                for machine_id, schedule in zip(machine_ids, await asyncio.gather(*tareas))
+                if schedule
+            }
+            total_orders = sum(len(schedule) for schedule in schedules_by_machine.values())
 
             # --- 7. Guardar todas las planificaciones ---
-            if not all_schedules:
+            if not schedules_by_machine:
                 return CommandResponse(
                     success=False,
                     message="No se generaron planificaciones válidas para ninguna máquina.",
@@ -376,18 +341,13 @@ class SchedulingService:
                     data=None
                 )
 
-            # Guardar por máquina
-            machines_updated = 0
-            for machine_id_int in orders_by_machine.keys():
-                machine_schedule = [s for s in all_schedules if s["machine_id"] == machine_id_int]
-                if machine_schedule:
-                    success = await self.db.overwrite_machine_schedule(machine_id_int, machine_schedule)
-                    if success:
-                        machines_updated += 1
+            # Guardar todas las máquinas en una sola transacción
+            success = await self.db.overwrite_all_schedules(schedules_by_machine)
+            machines_updated = len(schedules_by_machine) if success else 0
 
             message = (
                 f"Optimización global completada: {machines_updated} máquinas actualizadas, "
-                f"{len(all_schedules)} órdenes planificadas"
+                f"{total_orders} órdenes planificadas"
             )
             if reasignaciones:
                 message += f", {len(reasignaciones)} órdenes reasignadas entre máquinas."
@@ -399,7 +359,7 @@ class SchedulingService:
                 action_executed="generate_optimal_schedule_all_machines",
                 data={
                     "machines_updated": machines_updated,
-                    "total_orders": len(all_schedules),
+                    "total_orders": total_orders,
                     "reassignments": len(reasignaciones) if reasignaciones else 0
                 }
             )
@@ -413,6 +373,64 @@ class SchedulingService:
                 data=None
             )
 
+    def _optimize_single_machine(
+        self, 
+        machine_info: MachineModel, 
+        ordenes: List[SchedulableOrderModel], 
+        orders_by_id: Dict[int, SchedulableOrderModel]
+    ) -> List[Dict]:
+        """
+        Optimiza la secuencia de una máquina y calcula sus fechas probables.
+        Es síncrona (sin acceso a la DB) para poder ejecutarse en un hilo con asyncio.to_thread.
+        'orders_by_id' es el índice global de órdenes (solo se consulta con IDs de 'ordenes').
+        Devuelve los registros de la cola listos para guardar.
+        """
+        machine_id = machine_info.id
+
+        # Separar órdenes forzosas vs optimizables
+        ordenes_forzosas = sorted(
+            [o for o in ordenes if o.fecha_forzosa_entrega is not None], 
+            key=lambda o: o.fecha_forzosa_entrega
+        )
+        ordenes_optimizables = [o for o in ordenes if o.fecha_forzosa_entrega is None]
+
+        logger.info(
+            f"Máquina {machine_id}: {len(ordenes_forzosas)} forzosas, "
+            f"{len(ordenes_optimizables)} optimizables."
+        )
+
+        # Optimizar las órdenes no forzosas (con 0 o 1 no hay nada que ordenar: no se instancia el AG)
+        secuencia_optimizada_ids = (
+            [o.id for o in ordenes_optimizables] if len(ordenes_optimizables) <= 1
+            else AlgoritmoGeneticoFlexo(ordenes_optimizables, machine_info).optimizar(*parametros_ag(len(ordenes_optimizables)))
+        )
+
+        # Construir secuencia final con razones
+        razon_forzosa = "Prioridad absoluta por fecha forzosa."
+        razon_optimizada = "Posición calculada por optimizador genético global."
+        secuencia_final_con_razon: List[Tuple[int, str]] = list(chain(
+            ((o.id, razon_forzosa) for o in ordenes_forzosas),
+            ((oid, razon_optimizada) for oid in secuencia_optimizada_ids)
+        ))
+
+        # Razón por ID; setdefault conserva la primera aparición (las forzosas van antes)
+        razon_by_id: Dict[int, str] = {}
+        for pid, r in secuencia_final_con_razon:
+            razon_by_id.setdefault(pid, r)
+
+        # Calcular fechas probables
+        secuencia_ordenada_obj = [orders_by_id[oid] for oid, _ in secuencia_final_con_razon]
+
+        fecha_inicio = datetime.now()
+        ordenes_con_fechas = _DEFAULT_DATE_CALCULATOR.calcular_fechas_probables(
+            secuencia_ordenada_obj, 
+            fecha_inicio, 
+            machine_info
+        )
+
+        # Preparar para guardar
+        return _filas_planificacion(machine_id, ordenes_con_fechas, razon_by_id)
+
     async def prioritize_pedido(self, pedido_id: int, reoptimize: bool = False) -> CommandResponse:
         """
         Lógica de negocio para priorizar un pedido usando el Gestor de Prioridades.
@@ -465,12 +483,16 @@ class SchedulingService:
                 )
 
             # --- 4. Obtener la cola actual y las órdenes planificables ---
-            current_queue_items = await self.db.get_production_queue_for_machine(maquina_id)
-            schedulable_orders = await self.db.get_schedulable_orders_for_machine(maquina_id)
+            current_queue_items, schedulable_orders = await asyncio.gather(
+                self.db.get_production_queue_for_machine(maquina_id),
+                self.db.get_schedulable_orders_for_machine(maquina_id)
+            )
         
             # --- 5. VALIDACIÓN CRÍTICA: Verificar que el pedido a priorizar es planificable ---
             # Esto es importante para el futuro cuando las órdenes puedan cambiar de máquina
-            if not any(order.id == pedido_id for order in schedulable_orders):
+            # Convertir a diccionarios para acceso rápido (también sirve como conjunto de IDs planificables)
+            orders_dict = {order.id: order for order in schedulable_orders}
+            if pedido_id not in orders_dict:
                 logger.warning(
                     f"El pedido {pedido_id} está en la cola de la máquina {maquina_id} "
                     f"pero ya no es planificable en ella (posiblemente cambió de máquina al reordenar)."
@@ -482,8 +504,6 @@ class SchedulingService:
                     data=None
                 )
 
-            # Convertir a diccionarios para acceso rápido
-            orders_dict = {order.id: order for order in schedulable_orders}
             current_sequence_ids = [item.order_id for item in current_queue_items]
 
             logger.info(
@@ -522,10 +542,12 @@ class SchedulingService:
             # --- 8. Preparar actualizaciones para la base de datos ---
             updates_for_db = []
             ordenes_sin_registro = []
+            # Registro de la cola por pedido (recorrido al revés para quedarse con el primero si hubiera duplicados)
+            queue_by_order_id = {item.order_id: item for item in reversed(current_queue_items)}
 
             for i, p_id in enumerate(new_sequence, start=1):
                 # Buscar el registro en la cola que corresponde a este pedido
-                queue_item = next((item for item in current_queue_items if item.order_id == p_id), None)
+                queue_item = queue_by_order_id.get(p_id)
 
                 if queue_item:
                     updates_for_db.append({
@@ -588,6 +610,69 @@ class SchedulingService:
                 data=None
             )
 
+    async def _calcular_actualizaciones_cola(
+            self, machine_info: MachineModel, ordenes_secuenciadas: List[SchedulableOrdersFromMachine]
+        ) -> Tuple[List[Dict], CommandResponse]:
+        """
+        Calcula las fechas y tiempos de la cola de una máquina (pasos 3 y 4 de recalculate_delivery_dates)
+        y devuelve las filas a actualizar junto con la respuesta. Si no hay filas, la respuesta es el error.
+        """
+        logger.info(f"Recalculando fechas para {len(ordenes_secuenciadas)} órdenes en máquina {machine_info.id}...")
+
+        # --- 3. Calcular fechas probables ---
+        fecha_inicio = datetime.now()
+        # Cálculo puro de CPU: se ejecuta en un hilo para no bloquear el event loop
+        ordenes_con_fechas = await asyncio.to_thread(
+            _DEFAULT_DATE_CALCULATOR.calcular_fechas_probables, ordenes_secuenciadas, fecha_inicio, machine_info
+        )
+
+        # Log debug
+        if logger.isEnabledFor(logging.DEBUG):
+            # La cola no está vacía (se verificó antes), así que siempre hay una primera orden
+            primer_orden = ordenes_con_fechas[0]
+            logger.debug(
+                f"Órdenes calculadas: {len(ordenes_con_fechas)}; primera orden id_en_cola="
+                f"{primer_orden.get('id_en_cola')}, keys: {', '.join(primer_orden)}"
+            )
+
+        # --- 4. Preparar la actualización en bloque ---
+        # Solo las órdenes con su registro en la cola (id_en_cola) se pueden actualizar.
+        updates_for_db = [
+            dict(zip(_QUEUE_UPDATE_KEYS, (oc["id_en_cola"], *_get_fecha_y_tiempos(oc))))
+            for oc in ordenes_con_fechas if oc.get("id_en_cola") is not None
+        ]
+        omitidas = len(ordenes_con_fechas) - len(updates_for_db)
+        logger.info(
+            f"Actualizaciones preparadas: {len(updates_for_db)}/{len(ordenes_con_fechas)} "
+            f"(omitidas sin id_en_cola: {omitidas})"
+        )
+        if omitidas and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Órdenes sin id_en_cola válido: {[oc.get('id') for oc in ordenes_con_fechas if oc.get('id_en_cola') is None]}")
+
+        if not updates_for_db:
+            return [], CommandResponse(
+                success=False, 
+                message="No se generaron actualizaciones válidas.",
+                action_executed="recalculate_delivery_dates",
+                data=None
+            )
+
+        return updates_for_db, CommandResponse(
+            success=True,
+            message=(
+                f"Fechas recalculadas para {len(updates_for_db)} órdenes "
+                f"en máquina {machine_info.id}."
+            ),
+            action_executed="recalculate_delivery_dates",
+            data={
+                "machine_id": machine_info.id,
+                "orders_updated": len(updates_for_db),
+                # Hay al menos una actualización, así que la lista calculada nunca está vacía aquí
+                "primera_entrega": ordenes_con_fechas[0]["probable_fecha_entrega"].isoformat(),
+                "ultima_entrega": ordenes_con_fechas[-1]["probable_fecha_entrega"].isoformat()
+            }
+        )
+
     async def recalculate_delivery_dates(self, maquina_identifier: Union[int, str]) -> CommandResponse:
         """
         Recalcula las fechas probables de entrega para una máquina después de 
@@ -605,12 +690,8 @@ class SchedulingService:
             CommandResponse con el resultado de la operación
         """
         try:
-            # --- 1. Validar que la máquina existe ---
-            machine_info = None
-            if isinstance(maquina_identifier, int) or maquina_identifier.isdigit():
-                machine_info = await self.db.get_machine_by_id(int(maquina_identifier))
-            else:
-                machine_info = await self.db.get_machine_by_name_or_pseudonim(maquina_identifier)
+            # --- 1. Validar que la máquina existe (ID, nombre o seudónimo; el ID tiene prioridad) ---
+            machine_info = await self.db.resolve_machine(str(maquina_identifier).strip())
 
             if not machine_info:
                 return CommandResponse(
@@ -631,78 +712,28 @@ class SchedulingService:
                     data=None
                 )
 
-            logger.info(f"Recalculando fechas para {len(ordenes_secuenciadas)} órdenes en máquina {machine_info.id}...")
-
-            # --- 3. Calcular fechas probables ---
-            planner_config = PlannerConfig(
-                turnos_dia_semana=2, # Se trabajan 2 turnos
-                horas_por_turno_semana=12, # Cada turno dura 12 horas
-                dias_laborales=list(range(7)), # Lunes a Domingo
-                hora_inicio_turno1=8, # Los turnos empiezan a las 8am
-                turnos_sabado=2, # Se trabajan 2 turnos los sábados
-                horas_por_turno_sabado=12, # Cada turno del sábado dura 12 horas
-                eficiencia_maquina=0.95 # Ejemplo: esta máquina está al 95% de eficiencia
+            # Si ni la cola ni la máquina cambiaron desde el último recálculo (dentro del TTL) se reutilizan sus fechas
+            firma = (
+                machine_info.time_change_units, machine_info.avg_velocity,
+                tuple(map(_get_campos_recalculo, ordenes_secuenciadas))
             )
-            calculator = DateCalculator(config=planner_config)
-            fecha_inicio = datetime.now()
-            ordenes_con_fechas = calculator.calcular_fechas_probables(ordenes_secuenciadas, fecha_inicio, machine_info)
-
-            # Log debug
-            logger.info(f"=== DEBUG: Órdenes calculadas: {len(ordenes_con_fechas)} ===")
-            if ordenes_con_fechas:
-                primer_orden = ordenes_con_fechas[0]
-                logger.info(f"Primera orden keys: {list(primer_orden.keys())}")
-                logger.info(f"Primera orden tiene 'id_en_cola': {'id_en_cola' in primer_orden}")
-                logger.info(f"Valor de 'id_en_cola': {primer_orden.get('id_en_cola')}")
-
-            # --- 4. Preparar y ejecutar la actualización en bloque ---
-            updates_for_db = []
-            for orden_calculada in ordenes_con_fechas:
-                logger.info(f"Procesando orden {orden_calculada.get('id')}: id_en_cola={orden_calculada.get('id_en_cola')}")
-
-                # Ahora 'orden_calculada' contiene 'id_en_cola' que viene de la query
-                if "id_en_cola" in orden_calculada and orden_calculada["id_en_cola"] is not None:
-                    updates_for_db.append({
-                        'id': orden_calculada["id_en_cola"], # <-- Se usa el ID correcto
-                        'probable_delivery_date': orden_calculada["probable_fecha_entrega"],
-                        'tiempo_setup_min': orden_calculada.get("tiempo_setup_min"),
-                        'tiempo_cambios_internos_min': orden_calculada.get("tiempo_cambios_internos_min"),
-                        'tiempo_impresion_min': orden_calculada.get("tiempo_impresion_min"),
-                        'tiempo_buffer_min': orden_calculada.get("tiempo_buffer_min"),
-                        'tiempo_total_min': orden_calculada.get("tiempo_total_min"),
-                    })
-                else:
-                    logger.warning(f"Orden {orden_calculada.get('id')} no tiene id_en_cola válido")
-            
-            logger.info(f"Total de actualizaciones preparadas: {len(updates_for_db)}")
-
-            if not updates_for_db:
-                return CommandResponse(
-                    success=False, 
-                    message="No se generaron actualizaciones válidas.",
-                    action_executed="recalculate_delivery_dates",
-                    data=None
-                )
+            previo = self._last_recalc.get(machine_info.id)
+            desde_cache = previo is not None and previo[1] == firma and time.monotonic() - previo[0] < RECALC_CACHE_TTL_SECONDS
+            if desde_cache:
+                logger.info(f"Cola de la máquina {machine_info.id} sin cambios desde el último recálculo; se reutilizan sus fechas.")
+                _, _, updates_for_db, respuesta = previo
+            else:
+                updates_for_db, respuesta = await self._calcular_actualizaciones_cola(machine_info, ordenes_secuenciadas)
+                if not updates_for_db:
+                    return respuesta
 
+            # --- 5. Ejecutar la actualización en bloque, también con fechas del caché ---
             success = await self.db.update_queue_dates_and_times(updates_for_db)
             if success:
-                message = (
-                    f"Fechas recalculadas para {len(updates_for_db)} órdenes "
-                    f"en máquina {machine_info.id}."
-                )
-                logger.info(message)
-
-                return CommandResponse(
-                    success=True,
-                    message=message,
-                    action_executed="recalculate_delivery_dates",
-                    data={
-                        "machine_id": machine_info.id,
-                        "orders_updated": len(updates_for_db),
-                        "primera_entrega": ordenes_con_fechas[0]["probable_fecha_entrega"].isoformat() if ordenes_con_fechas else None,
-                        "ultima_entrega": ordenes_con_fechas[-1]["probable_fecha_entrega"].isoformat() if ordenes_con_fechas else None
-                    }
-                )
+                logger.info(respuesta.message)
+                if not desde_cache:
+                    self._last_recalc[machine_info.id] = (time.monotonic(), firma, updates_for_db, respuesta)
+                return respuesta
             else:
                 return CommandResponse(
                     success=False,
@@ -712,7 +743,7 @@ class SchedulingService:
                 )
 
         except Exception as e:
-            logger.error(f"Error al recalcular fechas para máquina {machine_info.id}: {e}", exc_info=True)
+            logger.error(f"Error al recalcular fechas para máquina {maquina_identifier}: {e}", exc_info=True)
             return CommandResponse(
                 success=False,
                 message=f"Error inesperado: {str(e)}",
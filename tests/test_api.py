@@ -1,22 +1,33 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 
+import main
 from main import app
+from api.v1.endpoints import commands
 from api.v1.dependencies import get_agent_instance
 from schemas.api_models import CommandResponse
 
-# El cliente de prueba para nuestra aplicación FastAPI
-client = TestClient(app)
-
 # --- Mock del Agente de Producción ---
 # Creamos un mock asíncrono que simulará ser nuestro ProductionAgent.
 # Esto evita hacer llamadas reales a la API de OpenAI durante las pruebas.
-mock_agent = AsyncMock()
+@pytest.fixture(scope="session")
+def client_and_mock():
+    """
+    Cliente de prueba y mock del agente compartidos por toda la sesión: la app se arranca una sola vez.
+    Usamos la potente función de FastAPI para sobreescribir la dependencia.
+    Ahora, cuando el endpoint pida `get_agent_instance`, FastAPI le dará nuestro mock.
+    """
+    mock_agent = AsyncMock()
+    app.dependency_overrides[get_agent_instance] = lambda: mock_agent
+    with TestClient(app) as client:
+        yield client, mock_agent
+    app.dependency_overrides.clear()
 
-# Usamos la potente función de FastAPI para sobreescribir la dependencia.
-# Ahora, cuando el endpoint pida `get_agent_instance`, FastAPI le dará nuestro mock.
-app.dependency_overrides[get_agent_instance] = lambda: mock_agent
+@pytest.fixture(autouse=True)
+def _reset_mock_agent(client_and_mock):
+    """Limpia el mock antes de cada prueba para que no arrastre llamadas de la anterior."""
+    client_and_mock[1].reset_mock()
 
 @pytest.mark.parametrize("user_input, agent_response, expected_status, expected_message_part", [
     (
@@ -50,11 +61,12 @@ app.dependency_overrides[get_agent_instance] = lambda: mock_agent
         "Fallo simulado del LLM"
     )
 ])
-def test_process_command_endpoint(user_input, agent_response, expected_status, expected_message_part):
+def test_process_command_endpoint(client_and_mock, user_input, agent_response, expected_status, expected_message_part):
     """
     Prueba parametrizada para el endpoint /process.
     Verifica que el endpoint orquesta correctamente la llamada al agente y al despachador.
     """
+    client, mock_agent = client_and_mock
     # Configuramos el valor de retorno de nuestro mock para esta prueba específica
     mock_agent.process_command.return_value = agent_response
     
@@ -71,11 +83,58 @@ def test_process_command_endpoint(user_input, agent_response, expected_status, e
     
     # Verificamos que nuestro mock fue llamado exactamente una vez con el texto correcto
     mock_agent.process_command.assert_called_once_with(user_input)
-    mock_agent.process_command.reset_mock() # Limpiamos el mock para la siguiente prueba
 
-def test_health_check_endpoint():
+def test_health_check_endpoint(client_and_mock):
     """Prueba el endpoint de health check."""
+    client, _ = client_and_mock
     response = client.get("/api/v1/commands/health")
     assert response.status_code == 200
     data = response.json()
-    assert data["status"] == "healthy"
\ No newline at end of file
+    assert data["status"] == "healthy"
+
+def test_enqueue_optimal_schedule_endpoint(client_and_mock, monkeypatch):
+    """El endpoint encola la tarea de Celery y devuelve su ID sin esperar el resultado."""
+    client, _ = client_and_mock
+    mock_task = MagicMock()
+    mock_task.delay.return_value = MagicMock(id="tarea-123")
+    monkeypatch.setattr(commands, "optimize_schedule_task", mock_task)
+
+    response = client.post("/api/v1/commands/schedule/Titán")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert data["data"] == {"task_id": "tarea-123"}
+    mock_task.delay.assert_called_once_with("Titán")
+
+@pytest.mark.parametrize("state, result, expected_success, expected_message_part", [
+    ("SUCCESS", {"success": True, "message": "ok"}, True, "finalizó"),
+    ("FAILURE", RuntimeError("sin conexión"), False, "sin conexión"),
+    ("PENDING", None, True, "en proceso"),
+])
+def test_get_task_status_endpoint(client_and_mock, monkeypatch, state, result, expected_success, expected_message_part):
+    """El endpoint traduce el estado de la tarea de Celery a un CommandResponse."""
+    client, _ = client_and_mock
+    mock_async_result = MagicMock(return_value=MagicMock(state=state, result=result))
+    monkeypatch.setattr(commands, "AsyncResult", mock_async_result)
+
+    response = client.get("/api/v1/commands/tasks/tarea-123")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is expected_success
+    assert expected_message_part in data["message"]
+    assert data["data"]["status"] == state
+    if state == "SUCCESS":
+        assert data["data"]["result"] == result
+    assert mock_async_result.call_args.args == ("tarea-123",)
+
+def test_health_lock_por_event_loop(monkeypatch):
+    """Cada event loop (aquí, cada TestClient) obtiene su propio lock del health check."""
+    monkeypatch.setattr(main, "HEALTH_CACHE_TTL_SECONDS", 0.0) # cada request refresca y toma el lock
+    locks = []
+    for _ in range(2):
+        with TestClient(app) as client:
+            assert client.get("/health").status_code == 200
+            locks.append(app.state.health_lock)
+    assert locks[0] is not locks[1]
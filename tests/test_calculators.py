@@ -0,0 +1,60 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.calculators import DateCalculator, PlannerConfig
+
+
+@pytest.fixture
+def calculadora_continua():
+    # Dos turnos de 12 horas los 7 días: jornada continua (24/7)
+    calculadora = DateCalculator(PlannerConfig(
+        turnos_dia_semana=2, horas_por_turno_semana=12, dias_laborales=list(range(7)),
+        turnos_sabado=2, horas_por_turno_sabado=12
+    ))
+    assert calculadora._jornada_continua
+    return calculadora
+
+
+def _encadenadas(calculadora, fecha_inicio, duraciones):
+    """Referencia: una llamada a _ajustar_horario_laboral por orden, como antes de _fechas_fin."""
+    fechas, fecha = [], fecha_inicio
+    for duracion in duraciones:
+        fecha = calculadora._ajustar_horario_laboral(fecha, duracion)
+        fechas.append(fecha)
+    return fechas
+
+
+FECHA_INICIO = datetime(2025, 3, 10, 7, 13, 27, 123456)
+
+
+@pytest.mark.parametrize("semilla", range(50))
+def test_fechas_fin_24_7_coincide_con_ajuste_encadenado(calculadora_continua, semilla):
+    rng = random.Random(semilla)
+    duraciones = [rng.uniform(0, 3000) for _ in range(rng.randint(2, 60))]
+
+    assert calculadora_continua._fechas_fin(FECHA_INICIO, duraciones) == _encadenadas(calculadora_continua, FECHA_INICIO, duraciones)
+
+
+def test_fechas_fin_24_7_redondea_empates_como_timedelta(calculadora_continua):
+    # Duraciones cuyo m * 60e6 cae justo en .5 µs en flotante aunque el valor exacto no sea un empate
+    duraciones = [291.518369325, 2739.075007958333, 2784.0239498583333, 0.5 / 60e6, 1.5 / 60e6, 0.0]
+
+    assert calculadora_continua._fechas_fin(FECHA_INICIO, duraciones) == _encadenadas(calculadora_continua, FECHA_INICIO, duraciones)
+
+
+@pytest.mark.parametrize("duraciones", [[], [137.25]])
+def test_fechas_fin_24_7_sin_ordenes_o_una_sola(calculadora_continua, duraciones):
+    fechas = calculadora_continua._fechas_fin(FECHA_INICIO, duraciones)
+
+    assert fechas == _encadenadas(calculadora_continua, FECHA_INICIO, duraciones)
+    assert fechas == [FECHA_INICIO + timedelta(minutes=d) for d in duraciones]
+
+
+def test_fechas_fin_con_huecos_no_usa_jornada_continua():
+    calculadora = DateCalculator(PlannerConfig())
+    duraciones = [480.0, 700.5, 95.25]
+
+    assert not calculadora._jornada_continua
+    assert calculadora._fechas_fin(FECHA_INICIO, duraciones) == _encadenadas(calculadora, FECHA_INICIO, duraciones)
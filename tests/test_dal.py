@@ -9,25 +9,38 @@ def db() -> DummyDB:
 @pytest.mark.asyncio
 async def test_get_machine_by_id(db: DummyDB):
     """Prueba que se puede obtener una máquina y que es un modelo Pydantic."""
-    machine = await db.get_machine_by_id("Titán")
+    machine = await db.get_machine_by_id("1")
     assert machine is not None
-    assert machine.id == "Titán" # <-- Se usa acceso por atributo, no por diccionario
-    assert machine.name == "Máquina Titán"
+    assert machine.id == 1 # <-- Se usa acceso por atributo, no por diccionario
+    assert machine.name == "Titán"
 
 @pytest.mark.asyncio
 async def test_update_machine_status(db: DummyDB):
-    """Prueba la actualización de estado de una máquina."""
-    success = await db.update_machine_status("Titán", "maintenance")
-    assert success is True
-    machine = await db.get_machine_by_id("Titán")
-    assert machine.status == "maintenance"
+    """Prueba la actualización de estado de una máquina; devuelve la fila actualizada."""
+    updated = await db.update_machine_status("1", status="mantenimiento")
+    assert updated is not None
+    assert updated.estatus == "mantenimiento"
+    machine = await db.get_machine_by_id("1")
+    assert machine.estatus == "mantenimiento"
+
+@pytest.mark.asyncio
+async def test_update_machine_status_inks_delta(db: DummyDB):
+    """El delta de tintas se limita al rango [0, numero_tintas]; una máquina inexistente devuelve None."""
+    machine = await db.get_machine_by_id("1")
+    updated = await db.update_machine_status("1", inks_delta=-(machine.functional_inks + 5))
+    assert updated.functional_inks == 0
+    updated = await db.update_machine_status("1", inks_delta=2)
+    assert updated.functional_inks == 2
+    updated = await db.update_machine_status("1", inks_delta=machine.inks + 5)
+    assert updated.functional_inks == updated.inks
+    assert await db.update_machine_status("No existe", status="mantenimiento") is None
 
 @pytest.mark.asyncio
 async def test_prioritize_order(db: DummyDB):
     """Prueba la lógica de priorización de órdenes."""
     await db.prioritize_order(order_id="555777", reorder_rest=True)
     queue = await db.get_production_queue()
-    assert queue[0].order_id == "555777"
+    assert queue[0].order_id.id == 555777
     assert queue[0].sequence_order == 1 # Verificamos que la secuencia se reordenó
 
 @pytest.mark.asyncio
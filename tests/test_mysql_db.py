@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session
+
+# El DAL importa sqlalchemy.ext.asyncio, que requiere greenlet (sqlalchemy[asyncio])
+pytest.importorskip("greenlet")
+
+from DataAbstractionLayer.mysql_db import MySQLDB
+from schemas.orm_models import Base, Machine
+
+
+def _fila(id, estatus="activa", **rangos):
+    """Fila como las que devuelve _classify_stmt: id, estatus y una columna r{i} por identificador."""
+    return SimpleNamespace(id=id, estatus=estatus, **rangos)
+
+
+def test_classify_stmt_empareja_en_sql_y_bloquea():
+    sql = str(MySQLDB._classify_stmt(["3", "Titán"]).compile(dialect=mysql.dialect()))
+
+    assert "FOR UPDATE" in sql
+    # Un rango por identificador; solo el numérico compara contra el ID
+    assert sql.count("CASE") == 2
+    assert "AS r0" in sql and "AS r1" in sql
+    assert sql.count("WHEN (maquina.id = %s)") == 1
+
+
+def test_classify_rows_id_tiene_prioridad_sobre_nombre():
+    # "2" es el ID de la máquina 2 y el nombre de la máquina 5
+    filas = [_fila(5, r0=1), _fila(2, r0=0)]
+
+    resultado = MySQLDB._classify_rows(["2"], filas, to_status="mantenimiento")
+
+    assert resultado["updated_ids"] == [2]
+    assert resultado["updated"] == ["2"]
+
+
+def test_classify_rows_nombre_tiene_prioridad_sobre_seudonimo():
+    # "X" es el seudónimo de la máquina 3 y el nombre de la máquina 7
+    filas = [_fila(3, r0=2), _fila(7, r0=1)]
+
+    assert MySQLDB._classify_rows(["X"], filas, to_status="mantenimiento")["updated_ids"] == [7]
+
+
+def test_classify_rows_alias_duplicados_cuentan_como_ya_procesados():
+    # Tres identificadores de la misma máquina (MySQL los empareja por collation: "titan" ~ "Titán")
+    filas = [_fila(1, r0=1, r1=1, r2=2)]
+
+    resultado = MySQLDB._classify_rows(["Titán", "titan", "T1"], filas, to_status="mantenimiento")
+
+    assert resultado["updated"] == ["Titán"]
+    assert resultado["already"] == ["titan", "T1"]
+    assert resultado["updated_ids"] == [1]
+
+
+def test_classify_rows_no_encontrados_y_no_elegibles():
+    filas = [_fila(1, estatus="mantenimiento", r0=1, r1=None), _fila(2, r0=None, r1=None)]
+
+    resultado = MySQLDB._classify_rows(["Titán", "Fantasma"], filas, to_status="mantenimiento")
+
+    assert resultado["already"] == ["Titán"]
+    assert resultado["not_found"] == ["Fantasma"]
+    assert resultado["updated_ids"] == []
+
+
+def test_classify_rows_from_status_restringe_elegibles():
+    filas = [_fila(1, estatus="activa", r0=1, r1=None), _fila(2, estatus="mantenimiento", r0=None, r1=1)]
+
+    resultado = MySQLDB._classify_rows(["A", "B"], filas, to_status="activa", from_status="mantenimiento")
+
+    assert resultado["updated_ids"] == [2]
+    assert resultado["already"] == ["A"]
+
+
+@pytest.fixture
+def maquinas():
+    """SQLite en memoria con máquinas cuyos identificadores se cruzan entre ID, nombre y seudónimo."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # Sin los índices de nombre/seudónimo SQLite recorre la tabla por rowid: el orden del resultado
+        # sale solo del ORDER BY de la consulta y no del índice que el planificador use para el OR.
+        conn.exec_driver_sql("DROP INDEX ix_maquina_nombre")
+        conn.exec_driver_sql("DROP INDEX ix_maquina_seudonimo")
+    datos = [(1, "Alfa", "X"), (2, "Beta", None), (5, "2", None), (7, "X", None), (8, "Gama", "Z"), (9, "Delta", "Z")]
+    with Session(engine) as session:
+        session.add_all([
+            Machine(id=id, name=nombre, pseudonym=seudonimo, max_width=1000, inks=8, exact_register=False,
+                    plant=1, time_change_units=10.0, avg_velocity=100.0, functional_inks=8)
+            for id, nombre, seudonimo in datos
+        ])
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+@pytest.mark.parametrize("identifier, esperado", [
+    ("2", 2),      # ID antes que el nombre "2" de la máquina 5
+    ("X", 7),      # nombre de la 7 antes que el seudónimo de la 1 (que tiene menor ID)
+    ("Alfa", 1),
+    ("Z", 8),      # mismo rango: el menor ID
+    ("Nadie", None),
+])
+def test_resolve_machine_stmt_prioriza_id_nombre_seudonimo(maquinas, identifier, esperado):
+    machine = maquinas.execute(MySQLDB._resolve_machine_stmt(identifier)).scalar_one_or_none()
+
+    assert (machine.id if machine else None) == esperado
@@ -0,0 +1,78 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from core.optimizer import AlgoritmoGeneticoFlexo, _cruce_ordenado
+from schemas.db_models import MachineModel, SchedulableOrderModel
+
+
+def _orden(id, colores, dias_restantes=None, metros=0.0, id_cliente=7):
+    return SchedulableOrderModel(
+        id=id, producto_id=1, status=1, datos=json.dumps({"id_cliente": id_cliente}),
+        fecha_entrega=None, fecha_forzosa_entrega=None, prioridad_planeacion=0,
+        dias_restantes=dias_restantes, producto_nombre="Producto", cantidad="1",
+        colores=json.dumps(colores), num_colores=len(colores), materiales='["BOPP"]',
+        total_peso_neto=1.0, total_metros_impresion=metros, num_etiquetas=1
+    )
+
+
+@pytest.fixture
+def maquina():
+    return MachineModel(
+        id=1, nombre="Flexo 1", ancho_maximo=1000, numero_tintas=8, planta=1, seudonimo=None,
+        comparte_rodillos=None, tiempo_cambio_unidad=10.0, velocidad_promedio=6000.0,
+        estatus="activa", tintas_funcionando=4
+    )
+
+
+@pytest.fixture
+def ordenes():
+    # A: 5 tintas (excede las 4 funcionales), sin fecha. B: 2 tintas, vence hoy, 10 min de producción.
+    return [
+        _orden(1, ["C", "M", "Y", "K", "R"]),
+        _orden(2, ["C", "M"], dias_restantes=0, metros=1000.0),
+    ]
+
+
+def test_evaluate_fitness_valores_conocidos(ordenes, maquina):
+    ag = AlgoritmoGeneticoFlexo(ordenes, maquina)
+
+    # Prioridad de tintas (-250000 + 12500) + sobrecapacidad (1000) + retraso de B (10 min * 20)
+    assert ag.toolbox.evaluate(np.array([0, 1], dtype=np.int32)) == pytest.approx((-236300.0,))
+    # Prioridad de tintas (25000 - 62500) + setup (40 * 100) + sobrecapacidad (1000) + retraso de B (200)
+    assert ag.toolbox.evaluate(np.array([1, 0], dtype=np.int32)) == pytest.approx((-32300.0,))
+
+
+def test_cruce_ordenado_produce_permutaciones():
+    random.seed(0)
+    for _ in range(50):
+        ind1 = np.random.permutation(20).astype(np.int32)
+        ind2 = np.random.permutation(20).astype(np.int32)
+        hijo1, hijo2 = _cruce_ordenado(ind1, ind2)
+        assert sorted(hijo1.tolist()) == list(range(20))
+        assert sorted(hijo2.tolist()) == list(range(20))
+
+
+def test_optimizar_devuelve_todos_los_ids(ordenes, maquina):
+    resultado = AlgoritmoGeneticoFlexo(ordenes, maquina).optimizar(poblacion_size=10, generaciones=5)
+
+    assert sorted(resultado) == [1, 2]
+    # La orden compleja debe ir primero
+    assert resultado[0] == 1
+
+
+def test_id_cliente_no_escalar_cuenta_como_sin_cliente(maquina):
+    # 'datos' mal formado: id_cliente como lista u objeto no debe abortar el AG
+    ordenes = [
+        _orden(1, ["C"], id_cliente=[7]),
+        _orden(2, ["C"], id_cliente={"id": 7}),
+        _orden(3, ["C"], id_cliente=7),
+        _orden(4, ["C"], id_cliente=7),
+    ]
+
+    ag = AlgoritmoGeneticoFlexo(ordenes, maquina)
+
+    assert ag._cliente_codigo.tolist() == [-1, -1, 0, 0]
+    assert sorted(ag.optimizar(poblacion_size=10, generaciones=2)) == [1, 2, 3, 4]
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from schemas import orm_models
+from schemas.orm_models import Base, OrdenPedido
+
+
+class _SesionAsync:
+    """Expone el execute() de una Session síncrona como corrutina (bulk_update_by_id solo usa execute)."""
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    async def execute(self, *args, **kwargs):
+        return self._session.execute(*args, **kwargs)
+
+
+def _actualizar_en_sqlite(rows, page_size):
+    """Carga 7 órdenes, aplica bulk_update_by_id y devuelve las columnas actualizables por id."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            OrdenPedido(
+                id=i, order_id=100 + i, machine_id=1, order_production=i,
+                probable_delivery_date=datetime(2025, 1, 1), tiempo_total_min=0.0
+            )
+            for i in range(1, 8)
+        ])
+        session.commit()
+
+        asyncio.run(OrdenPedido.bulk_update_by_id(_SesionAsync(session), rows, page_size=page_size))
+        session.commit()
+
+        filas = session.execute(
+            select(OrdenPedido.id, OrdenPedido.order_production,
+                   OrdenPedido.probable_delivery_date, OrdenPedido.tiempo_total_min)
+            .order_by(OrdenPedido.id)
+        ).all()
+    engine.dispose()
+    return [tuple(fila) for fila in filas]
+
+
+@pytest.mark.parametrize("page_size", [2, 3, 6])
+def test_bulk_update_case_por_pagina_equivale_al_update_por_fila(monkeypatch, page_size):
+    # Solo se actualizan 6 de las 7 filas (la 4 no se toca); con page_size 2, 3 y 6 las páginas
+    # terminan justo en el borde, y con 3 la primera página parte los ids no contiguos.
+    base = datetime(2025, 3, 10, 6, 0)
+    rows = [
+        {"id": i, "order_production": 10 - i,
+         "probable_delivery_date": base + timedelta(hours=i), "tiempo_total_min": i * 1.5}
+        for i in (7, 1, 2, 3, 5, 6)
+    ]
+
+    monkeypatch.setattr(orm_models, "BULK_UPDATE_THRESHOLD", len(rows) + 1)
+    por_fila = _actualizar_en_sqlite(rows, page_size)
+
+    monkeypatch.setattr(orm_models, "BULK_UPDATE_THRESHOLD", 1)
+    por_pagina = _actualizar_en_sqlite(rows, page_size)
+
+    assert por_pagina == por_fila
+    # La fila que no venía en el lote conserva sus valores
+    assert por_pagina[3] == (4, 4, datetime(2025, 1, 1), 0.0)
+    assert por_pagina[0] == (1, 9, base + timedelta(hours=1), 1.5)
+
+
+def test_bulk_update_case_emite_una_sentencia_por_pagina(monkeypatch):
+    ejecutadas = []
+
+    class _SesionQueRegistra:
+        async def execute(self, stmt, params=None):
+            ejecutadas.append((stmt, params))
+
+    rows = [{"id": i, "order_production": i} for i in range(1, 6)]
+    monkeypatch.setattr(orm_models, "BULK_UPDATE_THRESHOLD", 1)
+
+    asyncio.run(OrdenPedido.bulk_update_by_id(_SesionQueRegistra(), rows, page_size=2))
+
+    # 5 filas en páginas de 2: [1, 2], [3, 4], [5]; sin parámetros executemany
+    assert len(ejecutadas) == 3
+    assert all(params is None for _, params in ejecutadas)
+    assert "CASE" in str(ejecutadas[0][0])
@@ -0,0 +1,68 @@
+import json
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+
+from DataAbstractionLayer.dummy_db import DummyDB
+from schemas.db_models import SchedulableOrdersFromMachine
+from services import scheduling_service
+from services.scheduling_service import SchedulingService
+
+FECHA_EXTERNA = datetime(2000, 1, 1)
+
+
+def _orden_en_cola(id, id_en_cola, metros):
+    return SchedulableOrdersFromMachine(
+        id=id, producto_id=1, status=1, datos=json.dumps({"id_cliente": 7}),
+        fecha_entrega=None, fecha_forzosa_entrega=None, prioridad_planeacion=0, dias_restantes=None,
+        producto_nombre="Producto", id_en_cola=id_en_cola, order_production=id_en_cola,
+        probable_fecha_entrega=None, razon=None, cantidad="1", colores=json.dumps(["C", "M"]), num_colores=2,
+        materiales='["BOPP"]', total_peso_neto=1.0, total_metros_impresion=metros, num_etiquetas=1
+    )
+
+
+@pytest_asyncio.fixture
+async def db(monkeypatch):
+    """DummyDB con la cola de la máquina 1 (Titán) y su consulta de planificación simulada."""
+    db = DummyDB()
+    ordenes = [_orden_en_cola(10, 1, 1000.0), _orden_en_cola(11, 2, 2500.0)]
+    await db.overwrite_machine_schedule(1, [
+        {"id": o.id_en_cola, "order_id": o.id, "machine_id": 1, "order_production": o.order_production,
+         "probable_delivery_date": FECHA_EXTERNA}
+        for o in ordenes
+    ])
+
+    async def get_schedulable_orders_by_ids(maquina_id):
+        return list(ordenes) if maquina_id == 1 else []
+
+    monkeypatch.setattr(db, "get_schedulable_orders_by_ids", get_schedulable_orders_by_ids)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_recalculo_en_cache_reescribe_filas_modificadas_por_fuera(db, monkeypatch):
+    calculos = []
+    calcular = scheduling_service._DEFAULT_DATE_CALCULATOR.calcular_fechas_probables
+    monkeypatch.setattr(
+        scheduling_service._DEFAULT_DATE_CALCULATOR, "calcular_fechas_probables",
+        lambda *args: calculos.append(args) or calcular(*args)
+    )
+    service = SchedulingService(db)
+
+    primera = await service.recalculate_delivery_dates("1")
+    assert primera.success
+    fechas = {fila["id"]: fila["probable_delivery_date"] for fila in db._schedule}
+    assert FECHA_EXTERNA not in fechas.values()
+
+    # Otra petición (o un worker) reescribe la cola dentro del TTL del caché
+    await db.update_queue_dates_and_times([{"id": 1, "probable_delivery_date": FECHA_EXTERNA}])
+
+    segunda = await service.recalculate_delivery_dates("1")
+
+    assert segunda.success
+    assert segunda.data == primera.data
+    # Las fechas del caché se vuelven a escribir: la DB no queda con el valor externo
+    assert {fila["id"]: fila["probable_delivery_date"] for fila in db._schedule} == fechas
+    # El cálculo sí se reutilizó
+    assert len(calculos) == 1